@@ -1,4 +1,5 @@
 import logging
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -7,6 +8,100 @@ class Settings(BaseSettings):
     deepl_api_key: str
     deepl_url: str
     transcription_url: str
+    # Only needed with TRANSLATION_SERVICE=azure
+    azure_translate_api_key: str | None = None
+    azure_translate_url: str = "https://api.cognitive.microsofttranslator.com"
+    azure_region: str | None = None
+    # e.g. redis://localhost:6379/0; rooms are kept in-process when unset
+    broker_url: str | None = None
+    # Number of recent events per room kept for Last-Event-ID resumes
+    room_event_log_size: int = 500
+    # Room ids are drawn from [0, room_id_space), zero-padded to equal width
+    room_id_space: int = 10000
+    # Rooms without audio and listeners for this long are evicted
+    room_idle_timeout_s: float = 1800
+    room_reap_interval_s: float = 60
+    # Attach per-stage timings to SSE events so clients can show latency
+    trace_debug_events: bool = False
+    # Append trace spans as JSON lines to this file for offline analysis
+    trace_export_path: str | None = None
+    # "fake" swaps an upstream for an in-process stand-in, for benchmarks
+    transcription_service: Literal["gcp", "fake"] = "gcp"
+    translation_service: Literal["deepl", "azure", "nllb", "fake"] = "deepl"
+    # Median latency of the fake upstreams, log-normally distributed
+    fake_asr_latency_ms: float = 300
+    fake_translation_latency_ms: float = 150
+    fake_latency_sigma: float = 0.5
+    # Fraction of fake upstream calls that raise
+    fake_failure_rate: float = 0
+    # Connection pools to the upstreams, one per service
+    upstream_http2: bool = True
+    upstream_keepalive_expiry_s: float = 300
+    upstream_connect_timeout_s: float = 5
+    transcription_max_connections: int = 32
+    transcription_read_timeout_s: float = 30
+    translation_max_connections: int = 32
+    translation_read_timeout_s: float = 10
+    # Supported languages are refreshed from the upstream after this long
+    languages_ttl_s: float = 86400
+    # How long browsers and the CDN may cache GET /languages
+    languages_max_age_s: int = 3600
+    # Number of (room, language) pairs whose sentence translations are cached
+    translator_cache_size: int = 4096
+    # Characters per hour each (room, language) may translate, with bursts
+    # of up to translation_burst_chars; committed text is never held back
+    translation_chars_per_hour: int = 150000
+    translation_burst_chars: int = 2000
+    # Minimum seconds between volatile translations for a single listener,
+    # shortened by the square root of the number of listeners
+    volatile_translation_interval_s: float = 3.0
+    # Local translation with TRANSLATION_SERVICE=nllb, see app/services/nllb.py
+    nllb_model_path: str = "models/nllb-200-distilled-600M-int8"
+    nllb_tokenizer: str = "facebook/nllb-200-distilled-600M"
+    nllb_workers: int = 2
+    nllb_threads_per_worker: int = 2
+    nllb_max_batch_size: int = 32
+    nllb_max_batch_delay_ms: float = 5
+    nllb_beam_size: int = 2
+    # Hedge slow committed translations with the local NLLB engine rather
+    # than a second request to the translation service, needs hedging
+    nllb_fallback: bool = False
+    # Send a backup request for committed ASR and translation calls slower
+    # than this percentile of recent latency, adding at most this fraction
+    # of extra requests
+    hedging_enabled: bool = False
+    hedge_percentile: float = 95
+    hedge_min_delay_ms: float = 100
+    hedge_max_extra_load: float = 0.05
+    hedge_window: int = 200
+    # Adaptive (AIMD) limit on concurrent calls to the transcription service
+    asr_limiter_enabled: bool = True
+    asr_initial_concurrency: int = 4
+    asr_min_concurrency: int = 1
+    asr_max_concurrency: int = 64
+    asr_concurrency_backoff: float = 0.7
+    # Latency over this multiple of the no-load baseline counts as a spike
+    asr_latency_tolerance: float = 2.0
+    asr_max_volatile_queue: int = 32
+    # Fair scheduling of waiting chunks across rooms by seconds of audio. A
+    # room can be given a larger or smaller share when it is created, at
+    # most this many times the default one
+    asr_quantum_s: float = 1.0
+    asr_max_in_flight_per_room: int = 2
+    asr_max_room_weight: float = 4.0
+    # While the transcription service asks to back off with a 429, volatile
+    # chunks are dropped and committed ones retried once if its Retry-After
+    # is at most this many seconds
+    asr_max_retry_after_s: float = 3.0
+    # Transcribe volatile chunks with the transcription service's smaller
+    # fast model, which it only loads when FAST_MODEL_NAME is set there. Its
+    # words are never committed before the utterance ends, and the final
+    # chunk can't reuse the service's cached partial result
+    asr_fast_volatile: bool = False
+    # Commit the words of an utterance the ASR agrees on before it ends
+    transcript_stabilization: bool = True
+    # Base reconnect delay sent to SSE clients, jittered up to twice this
+    sse_retry_ms: int = 2000
 
 
 logger = logging.getLogger("uvicorn")
@@ -1,6 +1,60 @@
 import httpx
+from app.config import settings
+from app.lib.hedging import Hedger, create_hedger
+from app.lib.limiter import (
+    AdaptiveLimiter,
+    UpstreamBackoff,
+    create_transcription_limiter,
+)
+from app.lib.metrics import ACTIVE_LISTENERS, ACTIVE_ROOMS
+from app.lib.upstreams import create_upstream_client
+from app.services.broker import BaseBroker, create_broker
+from app.services.incremental_translation import IncrementalTranslators
+from app.services.languages import LanguageCache
+from app.services.nllb import NLLBEngine, create_nllb_engine
 from app.services.rooms import SSEManager
+from app.services.stabilizer import TranscriptStabilizers
 
 
-sse_manager: SSEManager = SSEManager()
-httpx_client: httpx.AsyncClient = httpx.AsyncClient()
+broker: BaseBroker = create_broker(settings.broker_url)
+transcription_limiter: AdaptiveLimiter | None = create_transcription_limiter()
+sse_manager: SSEManager = SSEManager(
+    broker,
+    transcription_limiter.scheduler if transcription_limiter is not None else None,
+)
+language_cache: LanguageCache = LanguageCache(settings.languages_ttl_s)
+nllb_engine: NLLBEngine | None = (
+    create_nllb_engine()
+    if settings.translation_service == "nllb" or settings.nllb_fallback
+    else None
+)
+transcription_hedger: Hedger | None = create_hedger("transcription")
+translation_hedger: Hedger | None = create_hedger("translation")
+transcription_backoff: UpstreamBackoff = UpstreamBackoff()
+stabilizers: TranscriptStabilizers | None = (
+    TranscriptStabilizers(broker) if settings.transcript_stabilization else None
+)
+translators: IncrementalTranslators = IncrementalTranslators(
+    settings.translator_cache_size
+)
+transcription_client: httpx.AsyncClient = create_upstream_client(
+    settings.transcription_url,
+    settings.transcription_max_connections,
+    settings.transcription_read_timeout_s,
+)
+translation_client: httpx.AsyncClient = create_upstream_client(
+    (
+        settings.azure_translate_url
+        if settings.translation_service == "azure"
+        else settings.deepl_url
+    ),
+    settings.translation_max_connections,
+    settings.translation_read_timeout_s,
+)
+
+ACTIVE_ROOMS.set_function(lambda: len(sse_manager.rooms))
+ACTIVE_LISTENERS.set_function(
+    lambda: sum(
+        len(room.subscriptions.client_streams) for room in sse_manager.rooms.values()
+    )
+)
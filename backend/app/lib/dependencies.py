@@ -1,37 +1,97 @@
 from typing import Annotated
 
 from fastapi import Depends
+from app.config import settings
+from app.services.fakes import FakeTranscriptionService, FakeTranslationService
 from app.services.rooms import SSEManager, RoomsService
 from app.services.transcription import (
     GCPTranscriptionService as TranscriptionService,
     BaseRemoteTranscriptionService,
 )
-from app.globals import httpx_client, sse_manager
+from app.globals import (
+    language_cache,
+    nllb_engine,
+    sse_manager,
+    stabilizers,
+    transcription_backoff,
+    transcription_client,
+    transcription_hedger,
+    transcription_limiter,
+    translation_client,
+    translation_hedger,
+    translators,
+)
+from app.services.languages import LanguageCache
+from app.services.nllb import NLLBTranslationService
 from app.services.translation import (
+    AzureTranslationService,
     BaseRemoteTranslationService,
     DeepLTranslationService,
 )
 
 
 async def get_transcription_service() -> BaseRemoteTranscriptionService:
-    return TranscriptionService(http_client=httpx_client)
+    if settings.transcription_service == "fake":
+        return FakeTranscriptionService()
+    return TranscriptionService(
+        http_client=transcription_client, backoff=transcription_backoff
+    )
 
 
 async def get_translation_service() -> BaseRemoteTranslationService:
-    return DeepLTranslationService(http_client=httpx_client)
+    if settings.translation_service == "fake":
+        return FakeTranslationService()
+    if settings.translation_service == "nllb":
+        if nllb_engine is None:
+            raise RuntimeError(
+                "The NLLB engine is only created at startup when "
+                "TRANSLATION_SERVICE is nllb"
+            )
+        return NLLBTranslationService(nllb_engine)
+    if settings.translation_service == "azure":
+        return AzureTranslationService(http_client=translation_client)
+    return DeepLTranslationService(http_client=translation_client)
+
+
+async def get_fallback_translation_service() -> BaseRemoteTranslationService | None:
+    if not settings.nllb_fallback or settings.translation_service == "nllb":
+        return None
+    if nllb_engine is None:
+        raise RuntimeError(
+            "The NLLB engine is only created at startup when NLLB_FALLBACK is set"
+        )
+    return NLLBTranslationService(nllb_engine)
 
 
 async def get_sse_manager() -> SSEManager:
     return sse_manager
 
 
+async def get_language_cache() -> LanguageCache:
+    return language_cache
+
+
 async def get_rooms_service(
     transcription_service: Annotated[
-        TranscriptionService, Depends(get_transcription_service)
+        BaseRemoteTranscriptionService, Depends(get_transcription_service)
     ],
     translation_service: Annotated[
         BaseRemoteTranslationService, Depends(get_translation_service)
     ],
+    fallback_translation_service: Annotated[
+        BaseRemoteTranslationService | None,
+        Depends(get_fallback_translation_service),
+    ],
     sse_manager: Annotated[SSEManager, Depends(get_sse_manager)],
 ) -> RoomsService:
-    return RoomsService(transcription_service, translation_service, sse_manager)
+    return RoomsService(
+        transcription_service,
+        translation_service,
+        sse_manager,
+        translators,
+        transcription_hedger,
+        translation_hedger,
+        transcription_limiter,
+        stabilizers,
+        fallback_translation_service,
+    )
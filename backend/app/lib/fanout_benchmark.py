@@ -0,0 +1,129 @@
+"""
+Microbenchmarks for the rooms fan-out path, run by `scripts/bench_fanout.py`
+and, in a small configuration, by the test suite.
+
+`SSEManager` and `RoomsService` run in-process against the in-memory broker
+and the fake upstreams, so they need neither DeepL credentials nor a GPU.
+"""
+
+import asyncio
+import time
+import tracemalloc
+
+from app.lib.sse import create_sse_response
+from app.services.broker import InMemoryBroker
+from app.services.fakes import (
+    FAKE_WORDS,
+    FakeTranscriptionService,
+    FakeTranslationService,
+)
+from app.services.incremental_translation import IncrementalTranslators
+from app.services.rooms import RoomsService, SSEManager
+
+LANGUAGES = ["de", "es", "fr", "ja", "zh", "it", "ko", "pt", "ru", "nl"]
+# Typical length of a volatile update
+SAMPLE_TEXT = " ".join(FAKE_WORDS[:12])
+
+
+def bench_encode(iterations: int) -> float:
+    """Seconds to encode one event for the SSE stream."""
+    message = {
+        "utterance_id": 12,
+        "committed": None,
+        "volatile": SAMPLE_TEXT,
+        "language_code": "es",
+    }
+    start = time.perf_counter()
+    for event_id in range(iterations):
+        create_sse_response("translation", message, event_id)
+    return (time.perf_counter() - start) / iterations
+
+
+async def bench_fanout(subscribers: int, languages: int, events: int) -> dict:
+    """Publish `events` utterances to a room and wait for every listener."""
+    sse_manager = SSEManager(InMemoryBroker())
+    room_id = await sse_manager.create_room()
+    language_codes = LANGUAGES[:languages]
+
+    # The first subscriber also sets up the room, keep it out of the average
+    listeners = [
+        await sse_manager.subscribe_to_room(room_id, "client-0", language_codes[0])
+    ]
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for i in range(1, subscribers):
+        listeners.append(
+            await sse_manager.subscribe_to_room(
+                room_id, f"client-{i}", language_codes[i % languages]
+            )
+        )
+    subscribed, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Every listener gets the transcription plus its own translation
+    expected = 2 * events
+
+    async def drain(listener):
+        received = 0
+        while received < expected:
+            received += len(await listener.next_events())
+
+    readers = [asyncio.create_task(drain(listener)) for listener in listeners]
+    await asyncio.sleep(0)
+
+    publish_time = 0.0
+    start = time.perf_counter()
+    for utterance_id in range(events):
+        publish_start = time.perf_counter()
+        await sse_manager.push_transcription_message(
+            room_id, SAMPLE_TEXT, False, time.time()
+        )
+        for language_code in language_codes:
+            await sse_manager.push_translation_message(
+                room_id,
+                utterance_id,
+                SAMPLE_TEXT,
+                False,
+                language_code=language_code,
+                received_ts=time.time(),
+            )
+        publish_time += time.perf_counter() - publish_start
+        # Let the relay and listeners run between utterances like live traffic
+        await asyncio.sleep(0)
+    await asyncio.gather(*readers)
+    delivery_time = time.perf_counter() - start
+
+    for i in range(subscribers):
+        await sse_manager.unsubscribe_from_room(room_id, f"client-{i}")
+
+    published = events * (1 + languages)
+    return {
+        "publish_us": publish_time / published * 1e6,
+        "delivery_us": delivery_time / published * 1e6,
+        "per_listener_ns": delivery_time / (subscribers * expected) * 1e9,
+        "bytes_per_subscriber": (subscribed - before) / max(1, subscribers - 1),
+    }
+
+
+async def bench_process_audio(languages: int, chunks: int) -> float:
+    """Seconds of backend overhead per audio chunk with instant upstreams."""
+    sse_manager = SSEManager(InMemoryBroker())
+    room_id = await sse_manager.create_room()
+    for i, language_code in enumerate(LANGUAGES[:languages]):
+        await sse_manager.subscribe_to_room(room_id, f"client-{i}", language_code)
+
+    rooms_service = RoomsService(
+        FakeTranscriptionService(latency_ms=0, failure_rate=0),
+        FakeTranslationService(latency_ms=0, failure_rate=0),
+        sse_manager,
+        IncrementalTranslators(max_size=len(LANGUAGES)),
+    )
+    audio = bytes(32000)
+    start = time.perf_counter()
+    for i in range(chunks):
+        await rooms_service.process_audio(audio, room_id, i % 4 == 3)
+    elapsed = time.perf_counter() - start
+
+    for i in range(languages):
+        await sse_manager.unsubscribe_from_room(room_id, f"client-{i}")
+    return elapsed / chunks
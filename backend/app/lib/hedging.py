@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+from app.config import settings
+from app.lib.metrics import HEDGED_REQUESTS
+
+T = TypeVar("T")
+
+# Samples needed before the percentile is trusted enough to hedge on
+MIN_SAMPLES = 20
+# Backups that may be sent back to back once the budget has built up
+MAX_BURST = 5
+
+
+class Hedger:
+    """
+    Sends a backup request when an upstream call is slower than usual.
+
+    If a call has not returned within the configured percentile of recent
+    latencies, the same request is sent again, or a fallback one such as a
+    local model, the first answer wins and the other one is cancelled.
+    Backups are paid for from a budget that grows by `max_extra_load` per
+    call, capping the extra load.
+    """
+
+    def __init__(
+        self,
+        upstream: str,
+        percentile: float,
+        min_delay_s: float,
+        max_extra_load: float,
+        window: int,
+    ):
+        self.upstream = upstream
+        self.percentile = percentile
+        self.min_delay_s = min_delay_s
+        self.max_extra_load = max_extra_load
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.budget = 0.0
+
+    def delay(self) -> float | None:
+        """Time to wait before hedging, or None while there is too little data."""
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+        return max(self.min_delay_s, latencies[index])
+
+    async def run(
+        self,
+        request: Callable[[], Awaitable[T]],
+        fallback: Callable[[], Awaitable[T]] | None = None,
+    ) -> T:
+        """Run `request`, backed up by `fallback` if given, else by itself."""
+        self.budget = min(self.budget + self.max_extra_load, MAX_BURST)
+        delay = self.delay()
+
+        start = time.monotonic()
+        primary = asyncio.ensure_future(request())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or self.budget < 1:
+                result = await primary
+                self.latencies.append(time.monotonic() - start)
+                return result
+
+            self.budget -= 1
+            HEDGED_REQUESTS.labels(self.upstream, "sent").inc()
+            backup_start = time.monotonic()
+            backup = asyncio.ensure_future((fallback or request)())
+            tasks.add(backup)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            HEDGED_REQUESTS.labels(self.upstream, "won").inc()
+                            # A fallback says nothing about the upstream, only
+                            # that it took at least this long
+                            self.latencies.append(
+                                time.monotonic()
+                                - (start if fallback is not None else backup_start)
+                            )
+                        else:
+                            self.latencies.append(time.monotonic() - start)
+                        return task.result()
+            # Both failed, report the original error
+            return primary.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def create_hedger(upstream: str) -> Hedger | None:
+    if not settings.hedging_enabled:
+        return None
+    return Hedger(
+        upstream,
+        percentile=settings.hedge_percentile,
+        min_delay_s=settings.hedge_min_delay_ms / 1000,
+        max_extra_load=settings.hedge_max_extra_load,
+        window=settings.hedge_window,
+    )
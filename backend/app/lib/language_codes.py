@@ -345,3 +345,47 @@ AZURE_TRANSLATE_LANGUAGE_CODES = Literal[
     "yua",
     "zu",
 ]
+
+
+# DeepL target language codes (lowercased) and their NLLB-200 equivalents
+DEEPL_TO_NLLB_LANGUAGE_CODES: dict[str, NLLB_LANGUAGE_CODES] = {
+    "ar": "arb_Arab",
+    "bg": "bul_Cyrl",
+    "cs": "ces_Latn",
+    "da": "dan_Latn",
+    "de": "deu_Latn",
+    "el": "ell_Grek",
+    "en": "eng_Latn",
+    "en-gb": "eng_Latn",
+    "en-us": "eng_Latn",
+    "es": "spa_Latn",
+    "et": "est_Latn",
+    "fi": "fin_Latn",
+    "fr": "fra_Latn",
+    "he": "heb_Hebr",
+    "hu": "hun_Latn",
+    "id": "ind_Latn",
+    "it": "ita_Latn",
+    "ja": "jpn_Jpan",
+    "ko": "kor_Hang",
+    "lt": "lit_Latn",
+    "lv": "lvs_Latn",
+    "nb": "nob_Latn",
+    "nl": "nld_Latn",
+    "pl": "pol_Latn",
+    "pt": "por_Latn",
+    "pt-br": "por_Latn",
+    "pt-pt": "por_Latn",
+    "ro": "ron_Latn",
+    "ru": "rus_Cyrl",
+    "sk": "slk_Latn",
+    "sl": "slv_Latn",
+    "sv": "swe_Latn",
+    "th": "tha_Thai",
+    "tr": "tur_Latn",
+    "uk": "ukr_Cyrl",
+    "vi": "vie_Latn",
+    "zh": "zho_Hans",
+    "zh-hans": "zho_Hans",
+    "zh-hant": "zho_Hant",
+}
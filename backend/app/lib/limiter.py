@@ -0,0 +1,171 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+from app.config import settings
+from app.lib.metrics import TRANSCRIPTION_CONCURRENCY_LIMIT, TRANSCRIPTION_QUEUE
+from app.lib.scheduler import FairScheduler, WorkShed
+
+
+class UpstreamOverloaded(WorkShed):
+    """Raised for volatile work the upstream turned away as overloaded."""
+
+
+class UpstreamBackoff:
+    """
+    Until when an upstream asked, with a `Retry-After`, not to be sent more
+    work. Shared by every request, the services are built per request.
+    """
+
+    def __init__(self) -> None:
+        self.retry_at = 0.0
+
+    def active(self) -> bool:
+        return time.monotonic() < self.retry_at
+
+    def back_off(self, seconds: float):
+        self.retry_at = max(self.retry_at, time.monotonic() + seconds)
+
+
+def is_overload(error: BaseException) -> bool:
+    """Whether an upstream error means it is overloaded rather than broken."""
+    if isinstance(error, (httpx.TimeoutException, UpstreamOverloaded)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for calls to an upstream.
+
+    The limit grows by one per round trip while latency stays near the
+    no-load baseline and is cut multiplicatively on latency spikes or
+    overload errors, keeping the upstream near its throughput optimum
+    instead of letting queues build up on both sides.
+
+    Work over the limit waits in the `scheduler`, which decides what runs
+    next when a slot frees up and which volatile work is shed.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        backoff: float,
+        latency_tolerance: float,
+        scheduler: FairScheduler,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.scheduler = scheduler
+        self.in_flight = 0
+        self.baseline: float | None = None
+        # Only cut the limit once per round trip of in-flight work
+        self.last_decrease = 0.0
+        TRANSCRIPTION_CONCURRENCY_LIMIT.set(self.limit)
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def _acquire(self, key: str, cost: float, is_utterance: bool):
+        waiter = self.scheduler.enqueue(key, cost, is_utterance)
+        self._wake()
+        try:
+            # The slot is handed over by `_wake` before the future resolves
+            await waiter.future
+        except asyncio.CancelledError:
+            future = waiter.future
+            # Shed work is failed with `WorkShed` without ever getting a slot
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self._release_slot(key)
+            else:
+                self.scheduler.remove(waiter)
+                self._update_queue_metrics()
+            raise
+
+    def _wake(self):
+        while self._has_capacity():
+            waiter = self.scheduler.next()
+            if waiter is None:
+                break
+            self.in_flight += 1
+            waiter.future.set_result(None)
+        self._update_queue_metrics()
+
+    def _release_slot(self, key: str):
+        self.in_flight -= 1
+        self.scheduler.finished(key)
+        self._wake()
+
+    def _update_queue_metrics(self):
+        TRANSCRIPTION_QUEUE.labels("committed").set(self.scheduler.committed_count)
+        TRANSCRIPTION_QUEUE.labels("volatile").set(self.scheduler.volatile_count)
+
+    def _on_result(self, latency: float | None):
+        """Adjust the limit after a call, `latency` is None on overload."""
+        now = time.monotonic()
+        if latency is None:
+            overloaded = True
+        else:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # Drift up slowly so the baseline follows a changing workload
+                self.baseline += 0.01 * (latency - self.baseline)
+            overloaded = latency > self.baseline * self.latency_tolerance
+        if overloaded:
+            if now - self.last_decrease > (self.baseline or 0):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = now
+        elif self.in_flight >= int(self.limit):
+            # Additive increase of one per limit's worth of completions
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        TRANSCRIPTION_CONCURRENCY_LIMIT.set(self.limit)
+
+    @asynccontextmanager
+    async def slot(self, key: str, cost: float, is_utterance: bool):
+        """
+        Wait for a free slot to call the upstream for `cost` seconds of audio.
+        Raises `WorkShed` if the work is dropped while waiting.
+        """
+        await self._acquire(key, cost, is_utterance)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_overload(e):
+                self._on_result(None)
+            elif not isinstance(e, WorkShed):
+                # Work shed before reaching the upstream says nothing about it
+                self._on_result(time.monotonic() - start)
+            raise
+        else:
+            self._on_result(time.monotonic() - start)
+        finally:
+            self._release_slot(key)
+
+
+def create_transcription_limiter() -> AdaptiveLimiter | None:
+    if not settings.asr_limiter_enabled:
+        return None
+    return AdaptiveLimiter(
+        initial_limit=settings.asr_initial_concurrency,
+        min_limit=settings.asr_min_concurrency,
+        max_limit=settings.asr_max_concurrency,
+        backoff=settings.asr_concurrency_backoff,
+        latency_tolerance=settings.asr_latency_tolerance,
+        scheduler=FairScheduler(
+            quantum_s=settings.asr_quantum_s,
+            max_in_flight=settings.asr_max_in_flight_per_room,
+            max_volatile=settings.asr_max_volatile_queue,
+        ),
+    )
@@ -0,0 +1,98 @@
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+# Duration of a single stage: "asr", "translate" (per language), "enqueue" on
+# the broker and "flush" from enqueueing an event to writing it to a client
+STAGE_LATENCY = Histogram(
+    "tyny_stage_latency_seconds",
+    "Duration of each stage of the audio pipeline",
+    ["stage", "language"],
+    buckets=LATENCY_BUCKETS,
+)
+
+ENQUEUE_AGE = Histogram(
+    "tyny_enqueue_age_seconds",
+    "Time from receiving audio to enqueuing each resulting event",
+    ["event_type"],
+    buckets=LATENCY_BUCKETS,
+)
+
+IN_FLIGHT = Gauge(
+    "tyny_in_flight",
+    "Work currently in progress per stage",
+    ["stage"],
+)
+
+LISTENER_BACKLOG = Histogram(
+    "tyny_listener_backlog_events",
+    "Number of events a listener picks up at once",
+    buckets=(1, 2, 3, 5, 10, 25, 50, 100, 250),
+)
+
+UPSTREAM_REQUESTS = Counter(
+    "tyny_upstream_requests_total",
+    "Requests to upstream services by outcome",
+    ["upstream", "outcome"],
+)
+
+# Source characters translated upstream ("sent") or served from the
+# sentence cache ("reused")
+TRANSLATED_CHARACTERS = Counter(
+    "tyny_translated_characters_total",
+    "Characters of transcription translated, by whether they were sent upstream",
+    ["source"],
+)
+
+VOLATILE_TRANSLATIONS_SKIPPED = Counter(
+    "tyny_volatile_translations_skipped_total",
+    "Volatile translations skipped by the per-language throttle",
+    ["language"],
+)
+
+# Backup requests "sent" to an upstream and those that answered first ("won")
+HEDGED_REQUESTS = Counter(
+    "tyny_hedged_requests_total",
+    "Backup requests sent to slow upstreams",
+    ["upstream", "outcome"],
+)
+
+TRANSCRIPTION_CONCURRENCY_LIMIT = Gauge(
+    "tyny_transcription_concurrency_limit",
+    "Adaptive limit on concurrent calls to the transcription service",
+)
+TRANSCRIPTION_QUEUE = Gauge(
+    "tyny_transcription_queue",
+    "Chunks waiting for a transcription slot",
+    ["priority"],
+)
+TRANSCRIPTION_WAIT = Histogram(
+    "tyny_transcription_wait_seconds",
+    "Time chunks wait for a transcription slot",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+# Volatile chunks dropped because a newer one replaced them ("coalesced"),
+# the queue was full ("overflow"), the transcription service rejected them
+# ("rejected") or asked to back off before they were sent ("backoff")
+TRANSCRIPTION_SHED = Counter(
+    "tyny_transcription_shed_total",
+    "Volatile chunks dropped instead of being transcribed",
+    ["reason"],
+)
+
+ACTIVE_ROOMS = Gauge("tyny_active_rooms", "Rooms with listeners on this worker")
+ACTIVE_LISTENERS = Gauge("tyny_active_listeners", "Listeners connected to this worker")
+
+
+@contextmanager
+def track_upstream(upstream: str):
+    """Count the outcome of a call to an upstream service."""
+    try:
+        yield
+    except Exception:
+        UPSTREAM_REQUESTS.labels(upstream, "error").inc()
+        raise
+    UPSTREAM_REQUESTS.labels(upstream, "success").inc()
@@ -0,0 +1,230 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from app.lib.metrics import TRANSCRIPTION_SHED, TRANSCRIPTION_WAIT
+
+# Rooms whose queue state and wait statistics are kept
+MAX_ROOMS = 4096
+
+
+class WorkShed(Exception):
+    """Raised for queued work the scheduler dropped instead of running."""
+
+
+class Waiter:
+    __slots__ = ("key", "cost", "is_utterance", "future", "enqueued_at")
+
+    def __init__(self, key: str, cost: float, is_utterance: bool):
+        self.key = key
+        self.cost = cost
+        self.is_utterance = is_utterance
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class RoomQueue:
+    """Waiting work, DRR deficit and wait statistics of one room."""
+
+    __slots__ = (
+        "weight",
+        "deficit",
+        "committed",
+        "volatile",
+        "in_flight",
+        "started",
+        "mean_wait_s",
+        "max_wait_s",
+        "audio_s",
+    )
+
+    # Weight of the newest sample in the wait moving average
+    WAIT_ALPHA = 0.1
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.deficit = 0.0
+        self.committed: deque[Waiter] = deque()
+        # Only the newest volatile chunk is worth transcribing
+        self.volatile: Waiter | None = None
+        self.in_flight = 0
+        self.started = 0
+        self.mean_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.audio_s = 0.0
+
+    def head(self) -> Waiter | None:
+        return self.committed[0] if self.committed else self.volatile
+
+    def record_wait(self, wait_s: float):
+        self.mean_wait_s += self.WAIT_ALPHA * (wait_s - self.mean_wait_s)
+        self.max_wait_s = max(self.max_wait_s, wait_s)
+
+
+class FairScheduler:
+    """
+    Weighted deficit round robin over per-room queues, by seconds of audio.
+
+    Each time a room's turn comes up without enough deficit for its next
+    chunk, it is credited `quantum_s` times its weight, so over time every
+    busy room gets upstream time in proportion to its weight however many or
+    small chunks it posts. A room never has more than `max_in_flight` chunks
+    in flight.
+
+    Within a room committed chunks go first. A newer volatile chunk replaces
+    the one still waiting and the oldest volatile chunk overall is shed when
+    more than `max_volatile` are waiting.
+    """
+
+    def __init__(self, quantum_s: float, max_in_flight: int, max_volatile: int):
+        self.quantum_s = quantum_s
+        self.max_in_flight = max_in_flight
+        self.max_volatile = max_volatile
+        self.rooms: OrderedDict[str, RoomQueue] = OrderedDict()
+        # Rooms with a weight other than 1
+        self.weights: dict[str, float] = {}
+        # Rooms with waiting work in round robin order
+        self.active: deque[str] = deque()
+        self.committed_count = 0
+        self.volatile_count = 0
+
+    def set_weight(self, key: str, weight: float):
+        if weight <= 0:
+            raise ValueError(f"Room weight must be positive, got {weight}")
+        if weight == 1.0:
+            self.weights.pop(key, None)
+        else:
+            self.weights[key] = weight
+        if key in self.rooms:
+            self.rooms[key].weight = weight
+
+    def forget(self, key: str):
+        """Drop the weight and, unless it still has work, the queue of a room."""
+        self.weights.pop(key, None)
+        room = self.rooms.get(key)
+        if room is not None and room.head() is None and not room.in_flight:
+            del self.rooms[key]
+
+    def _room(self, key: str) -> RoomQueue:
+        room = self.rooms.get(key)
+        if room is None:
+            room = self.rooms[key] = RoomQueue(self.weights.get(key, 1.0))
+            # Forget the least recently used idle room, other than the one
+            # about to get work
+            if len(self.rooms) > MAX_ROOMS:
+                for old_key, old_room in self.rooms.items():
+                    if (
+                        old_key != key
+                        and old_room.head() is None
+                        and not old_room.in_flight
+                    ):
+                        del self.rooms[old_key]
+                        break
+        else:
+            self.rooms.move_to_end(key)
+        return room
+
+    def _shed(self, waiter: Waiter, reason: str):
+        self.remove(waiter)
+        TRANSCRIPTION_SHED.labels(reason).inc()
+        waiter.future.set_exception(WorkShed())
+
+    def enqueue(self, key: str, cost: float, is_utterance: bool) -> Waiter:
+        room = self._room(key)
+        waiter = Waiter(key, cost, is_utterance)
+        if is_utterance:
+            room.committed.append(waiter)
+            self.committed_count += 1
+        else:
+            if room.volatile is not None:
+                self._shed(room.volatile, "coalesced")
+            elif self.volatile_count >= self.max_volatile:
+                oldest = min(
+                    (
+                        other.volatile
+                        for other in self.rooms.values()
+                        if other.volatile is not None
+                    ),
+                    key=lambda other: other.enqueued_at,
+                )
+                self._shed(oldest, "overflow")
+            room.volatile = waiter
+            self.volatile_count += 1
+        if key not in self.active:
+            self.active.append(key)
+        return waiter
+
+    def remove(self, waiter: Waiter):
+        """Take a waiter out of its queue, e.g. when it was cancelled."""
+        room = self.rooms.get(waiter.key)
+        if room is None:
+            return
+        if waiter.is_utterance:
+            if waiter not in room.committed:
+                return
+            room.committed.remove(waiter)
+            self.committed_count -= 1
+        else:
+            if room.volatile is not waiter:
+                return
+            room.volatile = None
+            self.volatile_count -= 1
+        if room.head() is None and waiter.key in self.active:
+            self.active.remove(waiter.key)
+            room.deficit = 0.0
+
+    def next(self) -> Waiter | None:
+        """Pick the next waiter to run, or None if nothing may run now."""
+        # Rooms passed over in a row because of their in-flight cap
+        capped = 0
+        while self.active and capped < len(self.active):
+            key = self.active[0]
+            room = self.rooms[key]
+            if room.in_flight >= self.max_in_flight:
+                self.active.rotate(-1)
+                capped += 1
+                continue
+            capped = 0
+
+            waiter = room.head()
+            # Rooms are only active while they have waiting work
+            assert waiter is not None
+            if waiter.cost > room.deficit:
+                room.deficit += self.quantum_s * room.weight
+                self.active.rotate(-1)
+                continue
+
+            room.deficit -= waiter.cost
+            self.remove(waiter)
+            self._start(room, waiter)
+            return waiter
+        return None
+
+    def _start(self, room: RoomQueue, waiter: Waiter):
+        wait_s = time.monotonic() - waiter.enqueued_at
+        room.in_flight += 1
+        room.started += 1
+        room.audio_s += waiter.cost
+        room.record_wait(wait_s)
+        TRANSCRIPTION_WAIT.labels(
+            "committed" if waiter.is_utterance else "volatile"
+        ).observe(wait_s)
+
+    def finished(self, key: str):
+        room = self.rooms.get(key)
+        if room is not None:
+            room.in_flight -= 1
+
+    def get_stats(self, key: str) -> dict[str, float] | None:
+        room = self.rooms.get(key)
+        if room is None:
+            return None
+        return {
+            "weight": room.weight,
+            "in_flight": room.in_flight,
+            "queued": len(room.committed) + (room.volatile is not None),
+            "started": room.started,
+            "audio_seconds": room.audio_s,
+            "mean_wait_seconds": room.mean_wait_s,
+            "max_wait_seconds": room.max_wait_s,
+        }
@@ -3,6 +3,13 @@ from typing import Literal
 
 
 def create_sse_response(
-    event_type: Literal["translation", "transcription", "error"], data: dict
+    event_type: Literal["translation", "transcription", "error"],
+    data: dict,
+    event_id: int | None = None,
 ):
-    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+    id_field = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_field}event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_sse_retry(retry_ms: int):
+    return f"retry: {retry_ms}\n\n"
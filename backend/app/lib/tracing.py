@@ -0,0 +1,95 @@
+import asyncio
+import json
+import secrets
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+
+from app.config import settings
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    start_ts: float
+    duration: float
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """Parse a `Server-Timing` header into durations in seconds."""
+    timings = {}
+    for metric in header.split(","):
+        name, *params = (part.strip() for part in metric.split(";"))
+        for param in params:
+            key, _, value = param.partition("=")
+            if name and key == "dur":
+                timings[name] = float(value) / 1000
+    return timings
+
+
+@dataclass(slots=True)
+class Trace:
+    """
+    Timing of one audio chunk through the backend and its upstreams.
+
+    The trace id travels to the transcription service in a W3C `traceparent`
+    header, and the per-stage durations it reports back in `Server-Timing` are
+    recorded as child spans.
+    """
+
+    trace_id: str = field(default_factory=lambda: secrets.token_hex(16))
+    start_ts: float = field(default_factory=time.time)
+    spans: list[Span] = field(default_factory=list)
+
+    def add_span(self, name: str, start_ts: float, duration: float):
+        self.spans.append(Span(name, start_ts, duration))
+
+    @contextmanager
+    def span(self, name: str):
+        start_ts = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start_ts, time.perf_counter() - start)
+
+    def add_server_timing(self, prefix: str, header: str | None, end_ts: float):
+        """Record upstream stages, laid out back to back up to `end_ts`."""
+        if not header:
+            return
+        timings = parse_server_timing(header)
+        start_ts = end_ts - sum(timings.values())
+        for name, duration in timings.items():
+            self.add_span(f"{prefix}.{name}", start_ts, duration)
+            start_ts += duration
+
+    def headers(self) -> dict[str, str]:
+        return {"traceparent": f"00-{self.trace_id}-{secrets.token_hex(8)}-01"}
+
+    def debug_fields(self, *span_prefixes: str) -> dict:
+        """Durations in ms for SSE events, limited to the given span prefixes."""
+        return {
+            "trace_id": self.trace_id,
+            "received_ts": self.start_ts,
+            "timings": {
+                span.name: round(span.duration * 1000, 1)
+                for span in self.spans
+                if span.name.startswith(span_prefixes)
+            },
+        }
+
+    async def export(self, **attributes):
+        """Append the spans as JSON lines to the configured collector file."""
+        if settings.trace_export_path is None:
+            return
+
+        lines = "".join(
+            json.dumps({"trace_id": self.trace_id, **asdict(span), **attributes}) + "\n"
+            for span in self.spans
+        )
+        await asyncio.to_thread(_append, settings.trace_export_path, lines)
+
+
+def _append(path: str, text: str):
+    with open(path, "a") as f:
+        f.write(text)
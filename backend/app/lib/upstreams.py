@@ -0,0 +1,45 @@
+import asyncio
+
+import httpx
+
+from app.config import logger, settings
+
+
+def create_upstream_client(
+    base_url: str, max_connections: int, read_timeout_s: float
+) -> httpx.AsyncClient:
+    """
+    Connection pool dedicated to a single upstream.
+
+    Connections are kept alive well past httpx's 5s default so that the first
+    chunk after a pause does not pay for DNS and a TLS handshake again. With
+    HTTP/2 all requests share one multiplexed connection where the upstream
+    supports it.
+    """
+    return httpx.AsyncClient(
+        base_url=base_url,
+        http2=settings.upstream_http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=settings.upstream_keepalive_expiry_s,
+        ),
+        timeout=httpx.Timeout(
+            read_timeout_s,
+            connect=settings.upstream_connect_timeout_s,
+            pool=settings.upstream_connect_timeout_s,
+        ),
+    )
+
+
+async def prewarm(*clients: httpx.AsyncClient):
+    """Open a connection to each upstream ahead of the first real request."""
+
+    async def open_connection(client: httpx.AsyncClient):
+        try:
+            # Any response will do, the connection stays in the pool
+            await client.head("/")
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to prewarm {client.base_url}: {e!r}")
+
+    await asyncio.gather(*(open_connection(client) for client in clients))
@@ -1,19 +1,45 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import Annotated
-from fastapi import Depends, FastAPI
-from app.lib.dependencies import get_transcription_service
+from fastapi import Depends, FastAPI, Response
+from app.config import logger
+from app.lib.dependencies import get_transcription_service, get_translation_service
 from app.routers import rooms, languages
-from app.globals import httpx_client
+from app.globals import (
+    broker,
+    language_cache,
+    nllb_engine,
+    sse_manager,
+    transcription_client,
+    translation_client,
+)
+from app.lib.upstreams import prewarm
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from app.services.transcription import GCPTranscriptionService as TranscriptionService
+from app.services.transcription import BaseRemoteTranscriptionService
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    reaper = asyncio.create_task(sse_manager.reap_idle_rooms())
+    await prewarm(transcription_client, translation_client)
+    if nllb_engine is not None:
+        await nllb_engine.start()
+    try:
+        await language_cache.get(await get_translation_service())
+    except Exception as e:
+        logger.warning(f"Failed to prefetch supported languages: {e!r}")
+
     yield
 
-    await httpx_client.aclose()
+    reaper.cancel()
+
+    await transcription_client.aclose()
+    await translation_client.aclose()
+    if nllb_engine is not None:
+        await nllb_engine.close()
+    await broker.close()
 
 
 origins = [
@@ -40,13 +66,18 @@ app.include_router(languages.router)
 @app.get("/wake-up")
 async def wake_up(
     transcription_service: Annotated[
-        TranscriptionService, Depends(get_transcription_service)
+        BaseRemoteTranscriptionService, Depends(get_transcription_service)
     ],
 ):
-    await transcription_service.wake_up()
+    await asyncio.gather(transcription_service.wake_up(), prewarm(translation_client))
     return {"message": "Wake up complete"}
 
 
 @app.get("/health")
 async def health():
     return {"message": "OK"}
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
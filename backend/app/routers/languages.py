@@ -1,8 +1,11 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response
+from fastapi.responses import JSONResponse
 
-from app.lib.dependencies import get_translation_service
+from app.config import settings
+from app.lib.dependencies import get_language_cache, get_translation_service
+from app.services.languages import LanguageCache
 from app.services.translation import BaseRemoteTranslationService
 
 router = APIRouter()
@@ -13,5 +16,14 @@ async def get_available_languages(
     translation_service: Annotated[
         BaseRemoteTranslationService, Depends(get_translation_service)
     ],
+    language_cache: Annotated[LanguageCache, Depends(get_language_cache)],
+    if_none_match: Annotated[str | None, Header()] = None,
 ):
-    return await translation_service.get_supported_languages()
+    languages, etag = await language_cache.get(translation_service)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.languages_max_age_s}",
+    }
+    if if_none_match is not None and etag in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(languages, headers=headers)
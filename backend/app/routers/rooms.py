@@ -1,25 +1,36 @@
+import time
 from typing import Annotated
 from fastapi import (
     APIRouter,
     BackgroundTasks,
     Body,
     Depends,
+    Header,
     HTTPException,
     Query,
 )
 
 from fastapi.responses import StreamingResponse
 
+from app.config import settings
 from app.globals import SSEManager
 from app.lib.dependencies import get_rooms_service, get_sse_manager
+from app.lib.tracing import Trace
 from app.services.rooms import RoomsService
 
 router = APIRouter(prefix="/rooms")
 
 
 @router.post("/")
-async def create_room(sse_manager: Annotated[SSEManager, Depends(get_sse_manager)]):
-    room_id = sse_manager.create_room()
+async def create_room(
+    sse_manager: Annotated[SSEManager, Depends(get_sse_manager)],
+    weight: Annotated[float, Query(gt=0, le=settings.asr_max_room_weight)] = 1.0,
+):
+    """
+    Create a room. While rooms wait for the transcription service, its
+    audio gets `weight` times the share of a default room.
+    """
+    room_id = await sse_manager.create_room(weight)
     print(f"Created room: {room_id}")
     return {"roomId": room_id}
 
@@ -32,45 +43,89 @@ async def send_audio(
     sse_manager: Annotated[SSEManager, Depends(get_sse_manager)],
     background_tasks: BackgroundTasks,
     is_utterance: bool = False,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    utterance: Annotated[int | None, Query(ge=0)] = None,
 ):
-    if room_id not in sse_manager.rooms:
+    """
+    Post audio of an utterance, starting `offset` samples into it.
+    `utterance` is the number of utterances posted to the room before it.
+
+    The response holds the offset from which audio of this utterance is
+    still needed, everything before it has been transcribed for good. It is
+    0 for clients that do not number their utterances.
+    """
+    received_ts = time.time()
+    if not await sse_manager.room_exists(room_id):
         raise HTTPException(
             status_code=404,
             detail="Room not found. Please create a room before sending audio.",
         )
 
+    await sse_manager.touch_room(room_id)
+
     background_tasks.add_task(
         rooms_service.process_audio,
         raw_data,
         room_id,
         is_utterance,
+        Trace(start_ts=received_ts),
+        offset,
+        utterance,
     )
 
-    return None
+    return {
+        "offset": (
+            0
+            if is_utterance
+            else await rooms_service.get_audio_offset(room_id, utterance)
+        )
+    }
 
 
 @router.get("/")
 async def get_all_rooms(
     rooms_service: Annotated[RoomsService, Depends(get_rooms_service)],
 ):
-    return {"rooms": rooms_service.get_all_rooms()}
+    return {"rooms": await rooms_service.get_all_rooms()}
 
 
 @router.get("/{room_id}")
 async def get_room(
     room_id: str, rooms_service: Annotated[RoomsService, Depends(get_rooms_service)]
 ):
-    if not rooms_service.get_room(room_id):
+    if not await rooms_service.get_room(room_id):
         raise HTTPException(status_code=404, detail="Room not found.")
     return None
 
 
+@router.get("/{room_id}/memory")
+async def get_room_memory(
+    room_id: str, sse_manager: Annotated[SSEManager, Depends(get_sse_manager)]
+):
+    if not await sse_manager.room_exists(room_id):
+        raise HTTPException(status_code=404, detail="Room not found.")
+    return await sse_manager.get_memory_usage(room_id)
+
+
+@router.get("/{room_id}/scheduling")
+async def get_room_scheduling(
+    room_id: str, rooms_service: Annotated[RoomsService, Depends(get_rooms_service)]
+):
+    stats = rooms_service.get_scheduling_stats(room_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No audio scheduled for room.")
+    return stats
+
+
 @router.get("/{room_id}/events")
 async def listen_to_room(
     room_id: str,
     rooms_service: Annotated[RoomsService, Depends(get_rooms_service)],
     target_lang: Annotated[list[str] | None, Query()] = None,
+    last_event_id: Annotated[int | None, Header()] = None,
 ):
-    event_generator = await rooms_service.listen_to_room(room_id, target_lang)
+    event_generator = await rooms_service.listen_to_room(
+        room_id, target_lang, last_event_id
+    )
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
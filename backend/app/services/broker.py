@@ -0,0 +1,383 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import AsyncIterator, cast
+
+import redis.asyncio as redis
+
+
+def _redis_slice(start: int, end: int) -> slice:
+    """Convert an inclusive Redis list range into a Python slice."""
+    return slice(start, None if end == -1 else end + 1)
+
+
+def _with_id(event_id: int, event: str) -> str:
+    """Add `"id"` to a JSON object, as the Redis script does."""
+    return f'{{"id":{event_id},{event[1:]}'
+
+
+class BrokerSubscription(ABC):
+    """An open subscription to a single broker channel."""
+
+    @abstractmethod
+    def __aiter__(self) -> AsyncIterator[str]:
+        pass
+
+    @abstractmethod
+    async def close(self) -> None:
+        pass
+
+
+class BaseBroker(ABC):
+    """
+    Shared state and pub/sub used by `SSEManager`.
+
+    The interface is a small subset of Redis so that rooms can be served by
+    any number of worker processes when a Redis-protocol server is used, while
+    a single process can run with the in-memory implementation.
+    """
+
+    @abstractmethod
+    async def publish(self, channel: str, message: str) -> None:
+        pass
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> BrokerSubscription:
+        pass
+
+    @abstractmethod
+    async def get_value(self, key: str) -> str | None:
+        pass
+
+    @abstractmethod
+    async def set_value(self, key: str, value: str) -> None:
+        pass
+
+    @abstractmethod
+    async def incr(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    async def sadd(self, key: str, member: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def srem(self, key: str, member: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def sismember(self, key: str, member: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def smembers(self, key: str) -> set[str]:
+        pass
+
+    @abstractmethod
+    async def scard(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        pass
+
+    @abstractmethod
+    async def hdecr(self, key: str, field: str) -> int:
+        """Atomically decrement a hash field, removing it once it reaches zero."""
+        pass
+
+    @abstractmethod
+    async def hgetall(self, key: str) -> dict[str, str]:
+        pass
+
+    @abstractmethod
+    async def rpush(self, key: str, value: str) -> int:
+        pass
+
+    @abstractmethod
+    async def lpop(self, key: str) -> str | None:
+        pass
+
+    @abstractmethod
+    async def ltrim(self, key: str, start: int, end: int) -> None:
+        pass
+
+    @abstractmethod
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        pass
+
+    @abstractmethod
+    async def publish_event(
+        self, id_key: str, log_key: str, channel: str, maxlen: int, event: str
+    ) -> int:
+        """
+        Atomically number and publish an event, returning its id.
+
+        `event` is a JSON object without an id. The next id from the counter
+        at `id_key` is added to it as `"id"`, then it is appended to the list
+        at `log_key`, which is trimmed to `maxlen`, and published on
+        `channel`. Events published by any worker end up numbered, logged and
+        delivered in one order.
+        """
+        pass
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemorySubscription(BrokerSubscription):
+    def __init__(self, broker: "InMemoryBroker", channel: str):
+        self.broker = broker
+        self.channel = channel
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            yield await self.queue.get()
+
+    async def close(self) -> None:
+        self.broker.channels[self.channel].discard(self.queue)
+        if not self.broker.channels[self.channel]:
+            del self.broker.channels[self.channel]
+
+
+class InMemoryBroker(BaseBroker):
+    """Process-local broker. Only suitable for a single worker."""
+
+    def __init__(self) -> None:
+        self.values: dict[str, str] = {}
+        self.sets: defaultdict[str, set[str]] = defaultdict(set)
+        self.lists: defaultdict[str, list[str]] = defaultdict(list)
+        self.hashes: defaultdict[str, dict[str, str]] = defaultdict(dict)
+        self.channels: defaultdict[str, set[asyncio.Queue[str]]] = defaultdict(set)
+
+    async def publish(self, channel: str, message: str) -> None:
+        for queue in self.channels.get(channel, ()):
+            queue.put_nowait(message)
+
+    async def subscribe(self, channel: str) -> BrokerSubscription:
+        subscription = InMemorySubscription(self, channel)
+        self.channels[channel].add(subscription.queue)
+        return subscription
+
+    async def get_value(self, key: str) -> str | None:
+        return self.values.get(key)
+
+    async def set_value(self, key: str, value: str) -> None:
+        self.values[key] = value
+
+    async def incr(self, key: str) -> int:
+        value = int(self.values.get(key, 0)) + 1
+        self.values[key] = str(value)
+        return value
+
+    async def sadd(self, key: str, member: str) -> bool:
+        members = self.sets[key]
+        if member in members:
+            return False
+        members.add(member)
+        return True
+
+    async def srem(self, key: str, member: str) -> bool:
+        members = self.sets.get(key)
+        if not members or member not in members:
+            return False
+        members.discard(member)
+        if not members:
+            del self.sets[key]
+        return True
+
+    async def sismember(self, key: str, member: str) -> bool:
+        return member in self.sets.get(key, ())
+
+    async def smembers(self, key: str) -> set[str]:
+        return set(self.sets.get(key, ()))
+
+    async def scard(self, key: str) -> int:
+        return len(self.sets.get(key, ()))
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        value = int(self.hashes[key].get(field, 0)) + amount
+        self.hashes[key][field] = str(value)
+        return value
+
+    async def hdecr(self, key: str, field: str) -> int:
+        value = await self.hincrby(key, field, -1)
+        if value <= 0:
+            del self.hashes[key][field]
+            if not self.hashes[key]:
+                del self.hashes[key]
+        return value
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self.hashes.get(key, {}))
+
+    async def rpush(self, key: str, value: str) -> int:
+        self.lists[key].append(value)
+        return len(self.lists[key])
+
+    async def lpop(self, key: str) -> str | None:
+        values = self.lists.get(key)
+        if not values:
+            return None
+        value = values.pop(0)
+        if not values:
+            del self.lists[key]
+        return value
+
+    async def ltrim(self, key: str, start: int, end: int) -> None:
+        if key in self.lists:
+            self.lists[key] = self.lists[key][_redis_slice(start, end)]
+
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return self.lists.get(key, [])[_redis_slice(start, end)]
+
+    async def publish_event(
+        self, id_key: str, log_key: str, channel: str, maxlen: int, event: str
+    ) -> int:
+        # No awaits in between, so nothing else runs until it is published
+        event_id = int(self.values.get(id_key, 0)) + 1
+        self.values[id_key] = str(event_id)
+        raw_event = _with_id(event_id, event)
+        self.lists[log_key].append(raw_event)
+        del self.lists[log_key][:-maxlen]
+        for queue in self.channels.get(channel, ()):
+            queue.put_nowait(raw_event)
+        return event_id
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+            self.lists.pop(key, None)
+            self.hashes.pop(key, None)
+
+
+class RedisSubscription(BrokerSubscription):
+    def __init__(self, pubsub: redis.client.PubSub):
+        self.pubsub = pubsub
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for message in self.pubsub.listen():
+            if message["type"] == "message":
+                yield message["data"]
+
+    async def close(self) -> None:
+        await self.pubsub.aclose()
+
+
+HDECR_SCRIPT = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if count <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+PUBLISH_EVENT_SCRIPT = """
+local id = redis.call('INCR', KEYS[1])
+local event = '{"id":' .. id .. ',' .. string.sub(ARGV[3], 2)
+redis.call('RPUSH', KEYS[2], event)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+redis.call('PUBLISH', ARGV[1], event)
+return id
+"""
+
+
+class RedisBroker(BaseBroker):
+    """
+    Broker backed by any server speaking the Redis protocol.
+
+    A pre-built client can be passed in, e.g. a `fakeredis` instance to run
+    against a local stand-in instead of a real server.
+    """
+
+    def __init__(self, url: str | None = None, client: redis.Redis | None = None):
+        if client is None:
+            if url is None:
+                raise ValueError("Either url or client must be provided")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        # Replies are decoded, so the `bytes | str` unions of the client's
+        # signatures are always `str`
+        self.client = client
+        self._hdecr = self.client.register_script(HDECR_SCRIPT)
+        self._publish_event = self.client.register_script(PUBLISH_EVENT_SCRIPT)
+
+    async def publish(self, channel: str, message: str) -> None:
+        await self.client.publish(channel, message)
+
+    async def subscribe(self, channel: str) -> BrokerSubscription:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        return RedisSubscription(pubsub)
+
+    async def get_value(self, key: str) -> str | None:
+        return cast(str | None, await self.client.get(key))
+
+    async def set_value(self, key: str, value: str) -> None:
+        await self.client.set(key, value)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def sadd(self, key: str, member: str) -> bool:
+        return bool(await self.client.sadd(key, member))
+
+    async def srem(self, key: str, member: str) -> bool:
+        return bool(await self.client.srem(key, member))
+
+    async def sismember(self, key: str, member: str) -> bool:
+        return bool(await self.client.sismember(key, member))
+
+    async def smembers(self, key: str) -> set[str]:
+        return cast(set[str], await self.client.smembers(key))
+
+    async def scard(self, key: str) -> int:
+        return await self.client.scard(key)
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        return await self.client.hincrby(key, field, amount)
+
+    async def hdecr(self, key: str, field: str) -> int:
+        return int(await self._hdecr(keys=[key], args=[field]))
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        return cast(dict[str, str], await self.client.hgetall(key))
+
+    async def rpush(self, key: str, value: str) -> int:
+        return await self.client.rpush(key, value)
+
+    async def lpop(self, key: str) -> str | None:
+        return cast(str | None, await self.client.lpop(key))
+
+    async def ltrim(self, key: str, start: int, end: int) -> None:
+        await self.client.ltrim(key, start, end)
+
+    async def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return cast(list[str], await self.client.lrange(key, start, end))
+
+    async def publish_event(
+        self, id_key: str, log_key: str, channel: str, maxlen: int, event: str
+    ) -> int:
+        return int(
+            await self._publish_event(
+                keys=[id_key, log_key], args=[channel, maxlen, event]
+            )
+        )
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*keys)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_broker(url: str | None) -> BaseBroker:
+    if url is None:
+        return InMemoryBroker()
+    return RedisBroker(url=url)
@@ -0,0 +1,108 @@
+import asyncio
+import random
+
+from app.config import settings
+from app.lib.tracing import Trace
+from app.services.transcription import BaseRemoteTranscriptionService, Word
+from app.services.translation import BaseRemoteTranslationService
+
+# Words per second of audio produced by the fake ASR, roughly conversational
+WORDS_PER_SECOND = 2.5
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+
+FAKE_WORDS = (
+    "the quick brown fox jumps over the lazy dog while a small band plays "
+    "quietly in the park near the old stone bridge"
+).split()
+
+
+class FakeUpstreamError(Exception):
+    pass
+
+
+async def simulate_upstream(latency_ms: float, sigma: float, failure_rate: float):
+    """Sleep for a log-normal latency around `latency_ms` and maybe fail."""
+    if latency_ms > 0:
+        await asyncio.sleep(random.lognormvariate(0, sigma) * latency_ms / 1000)
+    if random.random() < failure_rate:
+        raise FakeUpstreamError("Simulated upstream failure")
+
+
+class FakeTranscriptionService(BaseRemoteTranscriptionService):
+    """
+    In-process stand-in for the transcription service.
+
+    The text depends only on the audio length, so volatile updates of a
+    growing utterance are prefixes of one another like real transcripts.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float | None = None,
+        sigma: float | None = None,
+        failure_rate: float | None = None,
+    ):
+        self.latency_ms = (
+            settings.fake_asr_latency_ms if latency_ms is None else latency_ms
+        )
+        self.sigma = settings.fake_latency_sigma if sigma is None else sigma
+        self.failure_rate = (
+            settings.fake_failure_rate if failure_rate is None else failure_rate
+        )
+
+    async def transcribe(self, audio_data: bytes, trace: Trace | None = None) -> str:
+        text, _ = await self.transcribe_words(audio_data, trace)
+        return text
+
+    async def transcribe_words(
+        self, audio_data: bytes, trace: Trace | None = None, is_utterance: bool = True
+    ) -> tuple[str, list[Word] | None]:
+        await simulate_upstream(self.latency_ms, self.sigma, self.failure_rate)
+        seconds = len(audio_data) / (SAMPLE_RATE * BYTES_PER_SAMPLE)
+        word_count = max(1, round(seconds * WORDS_PER_SECOND))
+        words: list[Word] = [
+            {
+                "word": FAKE_WORDS[i % len(FAKE_WORDS)],
+                "start": i / WORDS_PER_SECOND,
+                "end": (i + 0.8) / WORDS_PER_SECOND,
+            }
+            for i in range(word_count)
+        ]
+        words[0]["word"] = words[0]["word"].capitalize()
+        return " ".join(word["word"] for word in words), words
+
+
+class FakeTranslationService(BaseRemoteTranslationService):
+    """In-process stand-in for DeepL that tags the text with the language."""
+
+    LANGUAGES = [
+        {"code": "de", "name": "German"},
+        {"code": "es", "name": "Spanish"},
+        {"code": "fr", "name": "French"},
+        {"code": "ja", "name": "Japanese"},
+        {"code": "zh", "name": "Chinese"},
+    ]
+
+    def __init__(
+        self,
+        latency_ms: float | None = None,
+        sigma: float | None = None,
+        failure_rate: float | None = None,
+    ):
+        self.latency_ms = (
+            settings.fake_translation_latency_ms if latency_ms is None else latency_ms
+        )
+        self.sigma = settings.fake_latency_sigma if sigma is None else sigma
+        self.failure_rate = (
+            settings.fake_failure_rate if failure_rate is None else failure_rate
+        )
+
+    async def translate(
+        self, text: str, language_code: str, context: str | None = None
+    ) -> str:
+        await simulate_upstream(self.latency_ms, self.sigma, self.failure_rate)
+        return f"[{language_code}] {text}"
+
+    async def get_supported_languages(self) -> list[dict[str, str]]:
+        return self.LANGUAGES
@@ -0,0 +1,223 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+
+from app.config import settings
+from app.lib.hedging import Hedger
+from app.lib.metrics import TRANSLATED_CHARACTERS
+from app.services.translation import BaseRemoteTranslationService
+
+# A sentence ends at terminal punctuation followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+# Translations into these languages are joined without spaces
+UNSPACED_LANGUAGES = ("ja", "zh", "th")
+
+
+def split_sentences(text: str) -> list[str]:
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+class VolatileThrottle:
+    """
+    Decides when a volatile translation is worth its characters.
+
+    Volatile partials are limited by a token bucket of characters, are never
+    sent faster than the upstream answers and are spaced further apart when
+    few listeners are waiting for them.
+    """
+
+    __slots__ = ("tokens", "refilled_at", "sent_at", "latency", "in_flight")
+
+    # Weight of the newest sample in the latency moving average
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self):
+        self.tokens = float(settings.translation_burst_chars)
+        self.refilled_at = time.monotonic()
+        self.sent_at = 0.0
+        self.latency = 0.0
+        self.in_flight = 0
+
+    def _refill(self, now: float):
+        rate = settings.translation_chars_per_hour / 3600
+        self.tokens = min(
+            settings.translation_burst_chars,
+            self.tokens + (now - self.refilled_at) * rate,
+        )
+        self.refilled_at = now
+
+    def min_interval(self, listeners: int) -> float:
+        return max(
+            self.latency,
+            settings.volatile_translation_interval_s / max(1, listeners) ** 0.5,
+        )
+
+    def should_translate(self, characters: int, listeners: int) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return (
+            not self.in_flight
+            and now - self.sent_at >= self.min_interval(listeners)
+            and self.tokens >= characters
+        )
+
+    @contextmanager
+    def track(self, characters: int):
+        """Spend the characters and measure the upstream latency."""
+        start = time.monotonic()
+        self._refill(start)
+        # Committed text may overdraw the bucket, delaying later partials
+        self.tokens -= characters
+        self.sent_at = start
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            latency = time.monotonic() - start
+            self.latency += self.LATENCY_ALPHA * (latency - self.latency)
+
+
+class IncrementalTranslator:
+    """
+    State for translating the growing transcription of one room into one
+    language, see `translate_incrementally`.
+
+    Every sentence but the last is complete, so its translation is cached and
+    reused by later updates of the same utterance. Only sentences that are new
+    or were revised by the ASR are sent upstream, each with the sentence before
+    it as context, and the results are stitched back together.
+    """
+
+    __slots__ = ("language_code", "translations", "context", "throttle")
+
+    def __init__(self, language_code: str):
+        self.language_code = language_code
+        self.translations: dict[str, str] = {}
+        # Last sentence of the previous utterance
+        self.context: str | None = None
+        self.throttle = VolatileThrottle()
+
+    def pending_characters(self, text: str) -> int:
+        """Characters of `text` that would be sent upstream."""
+        return sum(
+            len(sentence)
+            for sentence in split_sentences(text)
+            if sentence not in self.translations
+        )
+
+    def join(self, translations: list[str]) -> str:
+        separator = "" if self.language_code.startswith(UNSPACED_LANGUAGES) else " "
+        return separator.join(translations)
+
+    def update(self, sentences: list[str], translations: list[str], is_utterance: bool):
+        if is_utterance:
+            self.translations = {}
+            if sentences:
+                self.context = sentences[-1]
+        else:
+            # Keep only complete sentences that are still part of the utterance
+            self.translations = dict(zip(sentences[:-1], translations[:-1]))
+
+
+async def translate_incrementally(
+    translation_service: BaseRemoteTranslationService,
+    translators: list[IncrementalTranslator],
+    text: str,
+    is_utterance: bool,
+    hedger: Hedger | None = None,
+    fallback_service: BaseRemoteTranslationService | None = None,
+) -> dict[str, str]:
+    """
+    Translate `text` into the language of every translator.
+
+    Each sentence missing from any cache is requested once for all the
+    languages that need it, so a room with many languages makes one
+    multi-target request per changed sentence. With a `hedger`, slow
+    requests are sent again, to `fallback_service` if there is one.
+    """
+
+    def request(sentence: str, language_codes: list[str], context: str | None):
+        call = partial(
+            translation_service.translate_many,
+            sentence,
+            language_codes,
+            context=context,
+        )
+        if hedger is None:
+            return call()
+        fallback = None
+        if fallback_service is not None:
+            fallback = partial(
+                fallback_service.translate_many,
+                sentence,
+                language_codes,
+                context=context,
+            )
+        return hedger.run(call, fallback)
+
+    sentences = split_sentences(text)
+
+    # Languages waiting for each (sentence, context) and cache hits per language
+    requests: dict[tuple[str, str | None], list[str]] = {}
+    cached: list[dict[int, str]] = []
+    for translator in translators:
+        hits = {}
+        contexts = [translator.context, *sentences[:-1]]
+        for i, (sentence, context) in enumerate(zip(sentences, contexts)):
+            if sentence in translator.translations:
+                hits[i] = translator.translations[sentence]
+                TRANSLATED_CHARACTERS.labels("reused").inc(len(sentence))
+            else:
+                requests.setdefault((sentence, context), []).append(
+                    translator.language_code
+                )
+                TRANSLATED_CHARACTERS.labels("sent").inc(len(sentence))
+        cached.append(hits)
+
+    responses = await asyncio.gather(
+        *(
+            request(sentence, language_codes, context)
+            for (sentence, context), language_codes in requests.items()
+        )
+    )
+    fetched = dict(zip(requests, responses))
+
+    results = {}
+    for translator, hits in zip(translators, cached):
+        contexts = [translator.context, *sentences[:-1]]
+        translations = [
+            (
+                hits[i]
+                if i in hits
+                else fetched[(sentence, context)][translator.language_code]
+            )
+            for i, (sentence, context) in enumerate(zip(sentences, contexts))
+        ]
+        translator.update(sentences, translations, is_utterance)
+        results[translator.language_code] = translator.join(translations)
+    return results
+
+
+class IncrementalTranslators:
+    """Translators per (room, language), dropping the least recently used."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.translators: OrderedDict[tuple[str, str], IncrementalTranslator] = (
+            OrderedDict()
+        )
+
+    def get(self, room_id: str, language_code: str) -> IncrementalTranslator:
+        key = (room_id, language_code)
+        translator = self.translators.get(key)
+        if translator is None:
+            translator = self.translators[key] = IncrementalTranslator(language_code)
+            if len(self.translators) > self.max_size:
+                self.translators.popitem(last=False)
+        else:
+            self.translators.move_to_end(key)
+        return translator
@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from app.config import logger
+from app.services.translation import BaseRemoteTranslationService
+
+
+class LanguageCache:
+    """
+    In-memory copy of the supported target languages.
+
+    The list is fetched once and served from memory afterwards. Once it is
+    older than `ttl_s` the stale copy is still served while a single refresh
+    runs in the background, so a burst of page loads never turns into a burst
+    of upstream calls.
+    """
+
+    def __init__(self, ttl_s: float):
+        self.ttl_s = ttl_s
+        self.languages: list[dict[str, str]] | None = None
+        self.etag: str | None = None
+        self.fetched_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    async def get(
+        self, translation_service: BaseRemoteTranslationService
+    ) -> tuple[list[dict[str, str]], str]:
+        """Return the languages and their ETag, fetching them on first use."""
+        if self.languages is None:
+            await self.refresh(translation_service)
+        elif self._is_stale() and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(
+                self._refresh_in_background(translation_service)
+            )
+        # Both are set together by the first successful refresh
+        assert self.languages is not None and self.etag is not None
+        return self.languages, self.etag
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self.fetched_at > self.ttl_s
+
+    async def refresh(self, translation_service: BaseRemoteTranslationService):
+        async with self._lock:
+            # Another caller may have fetched the list while we waited
+            if self.languages is not None and not self._is_stale():
+                return
+            languages = await translation_service.get_supported_languages()
+            body = json.dumps(languages, sort_keys=True).encode()
+            self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+            self.languages = languages
+            self.fetched_at = time.monotonic()
+
+    async def _refresh_in_background(
+        self, translation_service: BaseRemoteTranslationService
+    ):
+        try:
+            await self.refresh(translation_service)
+        except Exception as e:
+            # Keep serving the stale list until the next attempt
+            logger.warning(f"Failed to refresh supported languages: {e!r}")
+            self.fetched_at = time.monotonic()
+        finally:
+            self._refresh_task = None
@@ -0,0 +1,241 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from app.config import logger, settings
+from app.lib.language_codes import DEEPL_TO_NLLB_LANGUAGE_CODES, NLLB_LANGUAGE_CODES
+from app.services.incremental_translation import UNSPACED_LANGUAGES, split_sentences
+from app.services.translation import BaseRemoteTranslationService
+
+SOURCE_LANGUAGE = "eng_Latn"
+
+LANGUAGE_NAMES = {
+    "ar": "Arabic",
+    "bg": "Bulgarian",
+    "cs": "Czech",
+    "da": "Danish",
+    "de": "German",
+    "el": "Greek",
+    "es": "Spanish",
+    "et": "Estonian",
+    "fi": "Finnish",
+    "fr": "French",
+    "he": "Hebrew",
+    "hu": "Hungarian",
+    "id": "Indonesian",
+    "it": "Italian",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "lt": "Lithuanian",
+    "lv": "Latvian",
+    "nb": "Norwegian (Bokmål)",
+    "nl": "Dutch",
+    "pl": "Polish",
+    "pt": "Portuguese",
+    "ro": "Romanian",
+    "ru": "Russian",
+    "sk": "Slovak",
+    "sl": "Slovenian",
+    "sv": "Swedish",
+    "th": "Thai",
+    "tr": "Turkish",
+    "uk": "Ukrainian",
+    "vi": "Vietnamese",
+    "zh": "Chinese",
+}
+
+# Model and tokenizer of each worker process, see `_load_model`
+_translator: Any = None
+_tokenizer: Any = None
+
+
+def _load_model(model_path: str, tokenizer_name: str, threads: int):
+    """Load the quantized model once per worker process."""
+    global _translator, _tokenizer
+
+    try:
+        import ctranslate2
+        import transformers
+    except ImportError as e:
+        logger.error(f"Failed to import the NLLB dependencies: {e}")
+        logger.error("Please install them with: uv sync --extra nllb")
+        raise
+
+    _translator = ctranslate2.Translator(
+        model_path,
+        device="cpu",
+        compute_type="int8",
+        inter_threads=1,
+        intra_threads=threads,
+    )
+    _tokenizer = transformers.AutoTokenizer.from_pretrained(
+        tokenizer_name, src_lang=SOURCE_LANGUAGE
+    )
+
+
+def _translate_batch(
+    texts: list[str], targets: list[NLLB_LANGUAGE_CODES], beam_size: int
+) -> list[str]:
+    """Decode a batch in which every text can have its own target language."""
+    source = [
+        _tokenizer.convert_ids_to_tokens(_tokenizer.encode(text)) for text in texts
+    ]
+    results = _translator.translate_batch(
+        source,
+        target_prefix=[[target] for target in targets],
+        beam_size=beam_size,
+        max_batch_size=len(source),
+    )
+    return [
+        # The first token is the target language prefix
+        _tokenizer.decode(
+            _tokenizer.convert_tokens_to_ids(result.hypotheses[0][1:]),
+            skip_special_tokens=True,
+        )
+        for result in results
+    ]
+
+
+class NLLBEngine:
+    """
+    Int8 NLLB-200 running on CPU in a pool of worker processes.
+
+    Requests arriving within `max_batch_delay_ms` of each other are decoded
+    together in a single batch, whatever their target language, which keeps
+    the cores busy when many sentences and languages are translated at once.
+
+    The model has to be converted for CTranslate2 first, e.g.
+    `ct2-transformers-converter --model facebook/nllb-200-distilled-600M
+    --quantization int8 --output_dir models/nllb-200-distilled-600M-int8`.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        tokenizer_name: str,
+        workers: int,
+        threads_per_worker: int,
+        max_batch_size: int,
+        max_batch_delay_ms: float,
+        beam_size: int,
+    ):
+        self.model_path = model_path
+        self.tokenizer_name = tokenizer_name
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay_ms = max_batch_delay_ms
+        self.beam_size = beam_size
+        self.pool: ProcessPoolExecutor | None = None
+        self.pending: list[tuple[str, str, asyncio.Future]] = []
+        self.flush_handle: asyncio.TimerHandle | None = None
+        self.batches: set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the workers and wait until each one has loaded the model."""
+        if not os.path.isdir(self.model_path):
+            raise FileNotFoundError(f"NLLB model not found at {self.model_path}")
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_load_model,
+            initargs=(self.model_path, self.tokenizer_name, self.threads_per_worker),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    self.pool, _translate_batch, ["Hello."], ["deu_Latn"], 1
+                )
+                for _ in range(self.workers)
+            )
+        )
+        logger.info(f"NLLB engine ready with {self.workers} workers")
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def translate(self, text: str, target: NLLB_LANGUAGE_CODES) -> str:
+        if self.pool is None:
+            raise RuntimeError("NLLB engine has not been started")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, target, future))
+
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(
+                self.max_batch_delay_ms / 1000, self._flush
+            )
+        return await future
+
+    def _flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def _run_batch(self, batch: list[tuple[str, str, asyncio.Future]]):
+        texts, targets, futures = zip(*batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.pool, _translate_batch, list(texts), list(targets), self.beam_size
+            )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def create_nllb_engine() -> NLLBEngine:
+    return NLLBEngine(
+        model_path=settings.nllb_model_path,
+        tokenizer_name=settings.nllb_tokenizer,
+        workers=settings.nllb_workers,
+        threads_per_worker=settings.nllb_threads_per_worker,
+        max_batch_size=settings.nllb_max_batch_size,
+        max_batch_delay_ms=settings.nllb_max_batch_delay_ms,
+        beam_size=settings.nllb_beam_size,
+    )
+
+
+class NLLBTranslationService(BaseRemoteTranslationService):
+    """
+    Translation with the local NLLB engine, taking DeepL-style codes.
+
+    Text is split into sentences, which are decoded in the same batch.
+    """
+
+    def __init__(self, engine: NLLBEngine):
+        self.engine = engine
+
+    async def translate(
+        self, text: str, language_code: str, context: str | None = None
+    ) -> str:
+        language_code = language_code.lower()
+        target = DEEPL_TO_NLLB_LANGUAGE_CODES.get(language_code)
+        if target is None:
+            raise ValueError(f"Unsupported language for NLLB: {language_code}")
+
+        sentences = split_sentences(text)
+        translations = await asyncio.gather(
+            *(self.engine.translate(sentence, target) for sentence in sentences)
+        )
+        separator = "" if language_code.startswith(UNSPACED_LANGUAGES) else " "
+        return separator.join(translations)
+
+    async def get_supported_languages(self) -> list[dict[str, str]]:
+        return [{"code": code, "name": name} for code, name in LANGUAGE_NAMES.items()]
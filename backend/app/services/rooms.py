@@ -1,14 +1,43 @@
 import asyncio
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
+import json
+import math
 import random
+import sys
 import time
-from typing import TypedDict
+from collections import deque
+from contextlib import ExitStack, nullcontext
+from functools import partial
+from typing import Literal, NamedTuple
 import uuid
 from fastapi import HTTPException
 import numpy as np
 from numpy.typing import NDArray
-from app.lib.sse import create_sse_response
-from app.services.transcription import GCPTranscriptionService as TranscriptionService
+from app.config import logger, settings
+from app.lib.hedging import Hedger
+from app.lib.limiter import AdaptiveLimiter
+from app.lib.scheduler import FairScheduler, WorkShed
+from app.lib.metrics import (
+    ENQUEUE_AGE,
+    IN_FLIGHT,
+    LISTENER_BACKLOG,
+    STAGE_LATENCY,
+    VOLATILE_TRANSLATIONS_SKIPPED,
+    track_upstream,
+)
+from app.lib.sse import create_sse_response, create_sse_retry
+from app.lib.tracing import Trace
+from app.services.broker import BaseBroker
+from app.services.incremental_translation import (
+    IncrementalTranslators,
+    translate_incrementally,
+)
+from app.services.stabilizer import (
+    SAMPLE_RATE,
+    TranscriptStabilizers,
+    stabilizer_key,
+)
+from app.services.transcription import BaseRemoteTranscriptionService
 from app.services.translation import BaseRemoteTranslationService
 
 
@@ -31,84 +60,413 @@ def bytes_to_float32_array(audio_bytes: bytes) -> NDArray[np.float32]:
     return float32_array
 
 
-class TranscriptionMessage(TypedDict):
+@dataclass(slots=True, kw_only=True)
+class TranscriptionMessage:
     utterance_id: int
     committed: str | None
     volatile: str | None
+    # Per-stage timings, only sent when trace_debug_events is enabled
+    debug: dict | None = None
 
 
+@dataclass(slots=True, kw_only=True)
 class TranslationMessage(TranscriptionMessage):
     language_code: str
 
 
-class LanguageDict(TypedDict):
-    last_ts: float
-    client_ids: set[str]
+TRANSCRIPTION_STREAM = "transcription"
+# 16 kHz mono 16-bit PCM, the format clients post audio in
+BYTES_PER_SECOND = SAMPLE_RATE * 2
 
 
-@dataclass
+class LoggedEvent(NamedTuple):
+    event_id: int
+    encoded: str
+    published_ts: float
+
+
+class BroadcastChannel:
+    """
+    Append-only ring buffer shared by every listener of one stream.
+
+    Events are stored once no matter how many listeners there are; each
+    listener only keeps a cursor (the sequence number of the next event it
+    will read). Appending wakes only the listeners waiting on this stream.
+    """
+
+    __slots__ = ("events", "next_seq", "last_ts", "waiters")
+
+    def __init__(self, maxlen: int):
+        self.events: deque[LoggedEvent] = deque(maxlen=maxlen)
+        self.next_seq = 0
+        # Received timestamp of the newest event, used to drop late volatiles
+        self.last_ts = 0.0
+        # Resolved on the next append, one per waiting listener
+        self.waiters: set[asyncio.Future[None]] = set()
+
+    @property
+    def first_seq(self) -> int:
+        return self.next_seq - len(self.events)
+
+    def append(self, event: LoggedEvent):
+        self.events.append(event)
+        self.next_seq += 1
+
+        waiters, self.waiters = self.waiters, set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def read(self, cursor: int) -> tuple[list[LoggedEvent], int]:
+        # Listeners that fell behind the ring skip what was overwritten
+        count = min(self.next_seq - cursor, len(self.events))
+        # Index from the right so catching up costs O(new events)
+        return [self.events[-i] for i in range(count, 0, -1)], self.next_seq
+
+    def seek(self, last_event_id: int) -> int:
+        """Return the cursor of the first event after `last_event_id`."""
+        cursor = self.next_seq
+        for event in reversed(self.events):
+            if event.event_id <= last_event_id:
+                break
+            cursor -= 1
+        return cursor
+
+
+class SubscriptionRegistry:
+    """
+    Reference-counted listener registrations for the streams of one room.
+
+    Counts are kept in a broker hash shared by all workers, where a stream's
+    entry is removed as soon as its count hits zero. The client -> streams
+    reverse index makes unsubscribing O(streams).
+    """
+
+    __slots__ = ("broker", "key", "client_streams")
+
+    def __init__(self, broker: BaseBroker, key: str):
+        self.broker = broker
+        self.key = key
+        self.client_streams: dict[str, tuple[str, ...]] = {}
+
+    async def add(self, client_id: str, streams: tuple[str, ...]):
+        self.client_streams[client_id] = streams
+        for stream in streams:
+            await self.broker.hincrby(self.key, stream)
+
+    async def remove(self, client_id: str):
+        streams = self.client_streams.pop(client_id, ())
+        for stream in streams:
+            await self.broker.hdecr(self.key, stream)
+
+
+@dataclass(slots=True)
 class Room:
-    utterance_id: int = 0
-    last_transcription_ts: float = 0
-    transcription_subscribers: set[str] = field(default_factory=set)
-    translations: dict[str, LanguageDict] = field(default_factory=dict)
-    client_queues: dict[
-        str, asyncio.Queue[TranscriptionMessage | TranslationMessage]
-    ] = field(default_factory=dict)
+    """Process-local state for a room that has listeners on this worker."""
+
+    subscriptions: SubscriptionRegistry
+    channels: dict[str, BroadcastChannel] = field(default_factory=dict)
+    relay_task: asyncio.Task | None = None
+    # Set once the channels have been backfilled from the broker's history
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def get_channel(self, stream: str) -> BroadcastChannel:
+        if stream not in self.channels:
+            self.channels[stream] = BroadcastChannel(settings.room_event_log_size)
+        return self.channels[stream]
+
+
+class RoomListener:
+    """A single SSE client reading one or more streams of a room."""
+
+    __slots__ = ("room", "cursors")
+
+    def __init__(self, room: Room, cursors: dict[str, int]):
+        self.room = room
+        self.cursors = cursors
+
+    def _poll(self) -> list[LoggedEvent]:
+        events: list[LoggedEvent] = []
+        for stream, cursor in self.cursors.items():
+            new_events, self.cursors[stream] = self.room.channels[stream].read(cursor)
+            events.extend(new_events)
+
+        if len(self.cursors) > 1:
+            events.sort(key=lambda event: event.event_id)
+        return events
+
+    async def next_events(self) -> list[LoggedEvent]:
+        """Wait until at least one new event is available and return them all."""
+        while True:
+            events = self._poll()
+            if events:
+                return events
+
+            # Registered right after polling, so no event can slip in between.
+            # Events of streams the listener doesn't read never wake it
+            waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            channels = [self.room.channels[stream] for stream in self.cursors]
+            for channel in channels:
+                channel.waiters.add(waiter)
+            try:
+                await waiter
+            finally:
+                for channel in channels:
+                    channel.waiters.discard(waiter)
+
+
+class RoomIdAllocator:
+    """
+    Hands out room ids from a fixed id space in O(1).
+
+    A shared counter walks an affine permutation of the space, so fresh ids
+    never collide and look unordered. Ids of evicted rooms go onto a free list
+    that is drawn from once the permutation is exhausted.
+    """
+
+    COUNTER_KEY = "rooms:next_index"
+    FREE_IDS_KEY = "rooms:free_ids"
+
+    def __init__(self, broker: BaseBroker, id_space: int):
+        self.broker = broker
+        self.id_space = id_space
+        self.width = len(str(id_space - 1))
+        # Any multiplier coprime with the space makes the map a bijection
+        self.multiplier = int(id_space * 0.618) | 1
+        while math.gcd(self.multiplier, id_space) != 1:
+            self.multiplier += 2
+        self.offset = id_space // 3
+
+    def _format(self, index: int) -> str:
+        return (
+            f"{(self.multiplier * index + self.offset) % self.id_space:0{self.width}d}"
+        )
+
+    async def allocate(self) -> str | None:
+        index = await self.broker.incr(self.COUNTER_KEY) - 1
+        if index < self.id_space:
+            return self._format(index)
+        return await self.broker.lpop(self.FREE_IDS_KEY)
+
+    async def release(self, room_id: str):
+        await self.broker.rpush(self.FREE_IDS_KEY, room_id)
 
 
 class SSEManager:
-    def __init__(self) -> None:
-        self.rooms: dict[str, Room] = {}
+    """
+    Routes room events between broadcasters and listeners.
 
-    def create_room(self) -> str:
-        room_id = f"{random.randint(0, 9999):04d}"
+    Room registrations, utterance ids and subscriptions live in the broker so
+    that any worker can accept audio for a room. Each worker relays the room's
+    broker channel into the queues of the listeners connected to it.
+    """
 
-        while room_id in self.rooms:
-            room_id = f"{random.randint(0, 9999):04d}"
+    ROOMS_KEY = "rooms"
 
-        self.rooms[room_id] = Room()
+    def __init__(
+        self, broker: BaseBroker, scheduler: FairScheduler | None = None
+    ) -> None:
+        self.broker = broker
+        self.rooms: dict[str, Room] = {}
+        self.room_ids = RoomIdAllocator(broker, settings.room_id_space)
+        # Forgets the transcription weights of evicted rooms
+        self.scheduler = scheduler
+
+    @staticmethod
+    def _channel(room_id: str) -> str:
+        return f"room:{room_id}:events"
+
+    @staticmethod
+    def _history_key(room_id: str) -> str:
+        return f"room:{room_id}:history"
+
+    @staticmethod
+    def _event_id_key(room_id: str) -> str:
+        return f"room:{room_id}:event_id"
+
+    @staticmethod
+    def _last_audio_ts_key(room_id: str) -> str:
+        return f"room:{room_id}:last_audio_ts"
+
+    @staticmethod
+    def _utterance_id_key(room_id: str) -> str:
+        return f"room:{room_id}:utterance_id"
+
+    @staticmethod
+    def _subscriptions_key(room_id: str) -> str:
+        return f"room:{room_id}:subscriptions"
+
+    @staticmethod
+    def _weight_key(room_id: str) -> str:
+        return f"room:{room_id}:weight"
+
+    async def create_room(self, weight: float = 1.0) -> str:
+        """
+        Register a new room. Its audio gets `weight` times the default share
+        of the transcription service while rooms have to wait for it.
+        """
+        room_id = await self.room_ids.allocate()
+        if room_id is None:
+            raise HTTPException(status_code=503, detail="No room IDs available.")
+
+        await self.touch_room(room_id)
+        if weight != 1.0:
+            await self.broker.set_value(self._weight_key(room_id), str(weight))
+        await self.broker.sadd(self.ROOMS_KEY, room_id)
 
         return room_id
 
-    def subscribe_to_room(
+    async def get_room_weight(self, room_id: str) -> float:
+        return float(await self.broker.get_value(self._weight_key(room_id)) or 1.0)
+
+    async def touch_room(self, room_id: str):
+        """Record audio activity so the reaper leaves the room alone."""
+        await self.broker.set_value(self._last_audio_ts_key(room_id), str(time.time()))
+
+    async def has_listeners(self, room_id: str) -> bool:
+        return bool(await self.broker.hgetall(self._subscriptions_key(room_id)))
+
+    async def evict_room(self, room_id: str) -> bool:
+        # Only the worker that removes the registration recycles the id
+        if not await self.broker.srem(self.ROOMS_KEY, room_id):
+            return False
+
+        await self.broker.delete(
+            self._history_key(room_id),
+            self._event_id_key(room_id),
+            self._last_audio_ts_key(room_id),
+            self._utterance_id_key(room_id),
+            self._subscriptions_key(room_id),
+            self._weight_key(room_id),
+            stabilizer_key(room_id),
+        )
+        if self.scheduler is not None:
+            self.scheduler.forget(room_id)
+
+        room = self.rooms.pop(room_id, None)
+        if room is not None and room.relay_task is not None:
+            room.relay_task.cancel()
+
+        await self.room_ids.release(room_id)
+        return True
+
+    async def reap_idle_rooms(self):
+        """Periodically evict rooms with neither recent audio nor listeners."""
+        while True:
+            await asyncio.sleep(settings.room_reap_interval_s)
+
+            now = time.time()
+            for room_id in await self.get_room_ids():
+                try:
+                    last_audio_ts = float(
+                        await self.broker.get_value(self._last_audio_ts_key(room_id))
+                        or 0
+                    )
+                    if now - last_audio_ts < settings.room_idle_timeout_s:
+                        continue
+                    if await self.has_listeners(room_id):
+                        continue
+
+                    if await self.evict_room(room_id):
+                        logger.info(f"Evicted idle room: {room_id}")
+                except Exception as e:
+                    logger.error(f"Failed to reap room {room_id}: {e}")
+
+    async def get_memory_usage(self, room_id: str) -> dict[str, int]:
+        """Approximate bytes held for a room, locally and in the broker."""
+        history = await self.broker.lrange(self._history_key(room_id), 0, -1)
+        report = {
+            "history_events": len(history),
+            "history_bytes": sum(sys.getsizeof(event) for event in history),
+            "listeners": 0,
+            "channels": 0,
+            "event_log_events": 0,
+            "event_log_bytes": 0,
+        }
+
+        room = self.rooms.get(room_id)
+        if room is not None:
+            report["listeners"] = len(room.subscriptions.client_streams)
+            report["channels"] = len(room.channels)
+            for channel in room.channels.values():
+                report["event_log_events"] += len(channel.events)
+                report["event_log_bytes"] += sum(
+                    sys.getsizeof(event.encoded) for event in channel.events
+                )
+
+        return report
+
+    async def room_exists(self, room_id: str) -> bool:
+        return await self.broker.sismember(self.ROOMS_KEY, room_id)
+
+    async def get_room_ids(self) -> list[str]:
+        return sorted(await self.broker.smembers(self.ROOMS_KEY))
+
+    async def get_utterance_id(self, room_id: str) -> int:
+        return int(await self.broker.get_value(self._utterance_id_key(room_id)) or 0)
+
+    async def subscribe_to_room(
         self,
         room_id: str,
         client_id: str,
         language_code: str | list[str] | None = None,
         no_transcriptions: bool = False,
-    ):
-        if room_id not in self.rooms:
+        last_event_id: int | None = None,
+    ) -> RoomListener:
+        if not await self.room_exists(room_id):
             raise HTTPException(status_code=404, detail="Room not found.")
 
-        room = self.rooms[room_id]
-
-        if not no_transcriptions:
-            room.transcription_subscribers.add(client_id)
-
+        lang_code_arr: list[str] = []
         if language_code is not None:
             lang_code_arr = (
                 language_code if isinstance(language_code, list) else [language_code]
             )
 
-            for lang_code in lang_code_arr:
-                if lang_code not in room.translations:
-                    room.translations[lang_code] = LanguageDict(
-                        last_ts=0, client_ids=set()
-                    )
-                room.translations[lang_code]["client_ids"].add(client_id)
+        if room_id not in self.rooms:
+            self.rooms[room_id] = Room(
+                SubscriptionRegistry(self.broker, self._subscriptions_key(room_id))
+            )
+        room = self.rooms[room_id]
 
-        room.client_queues[client_id] = asyncio.Queue()
+        if room.relay_task is None:
+            room.relay_task = asyncio.create_task(
+                self._relay_room_events(room_id, room)
+            )
 
-    def get_subscribed_language_codes(self, room_id: str) -> list[str]:
-        room = self.rooms[room_id]
-        return [
-            lang_code
-            for lang_code in room.translations.keys()
-            if len(room.translations[lang_code]["client_ids"]) > 0
-        ]
+        # Place cursors only once the channels are backfilled, so resuming
+        # clients are served what they missed straight from the log
+        await room.ready.wait()
+
+        streams = [TRANSCRIPTION_STREAM] if not no_transcriptions else []
+        streams.extend(lang_code_arr)
+
+        cursors: dict[str, int] = {}
+        for stream in streams:
+            channel = room.get_channel(stream)
+            cursors[stream] = (
+                channel.seek(last_event_id)
+                if last_event_id is not None
+                else channel.next_seq
+            )
+
+        await room.subscriptions.add(client_id, tuple(cursors))
+
+        return RoomListener(room, cursors)
+
+    async def get_subscribed_language_codes(self, room_id: str) -> list[str]:
+        return list(await self.get_language_listener_counts(room_id))
+
+    async def get_language_listener_counts(self, room_id: str) -> dict[str, int]:
+        """Number of listeners per subscribed language across all workers."""
+        return {
+            stream: int(count)
+            for stream, count in (
+                await self.broker.hgetall(self._subscriptions_key(room_id))
+            ).items()
+            if stream != TRANSCRIPTION_STREAM
+        }
 
-    def push_translation_message(
+    async def push_translation_message(
         self,
         room_id: str,
         utterance_id: int,
@@ -116,141 +474,369 @@ class SSEManager:
         is_utterance: bool,
         language_code: str,
         received_ts: float,
+        debug: dict | None = None,
     ):
-        translation_dict = self.rooms[room_id].translations
-
-        if (
-            not is_utterance
-            and received_ts < translation_dict[language_code]["last_ts"]
-        ):
-            return
-
         translation_message = TranslationMessage(
             committed=translation if is_utterance else None,
             volatile=translation,
             language_code=language_code,
             utterance_id=utterance_id,
+            debug=debug,
         )
 
-        if translation_message["language_code"] in translation_dict:
-            for client_id in translation_dict[translation_message["language_code"]][
-                "client_ids"
-            ]:
-                self.rooms[room_id].client_queues[client_id].put_nowait(
-                    translation_message
-                )
+        await self._publish(room_id, translation_message, is_utterance, received_ts)
 
-        translation_dict[language_code]["last_ts"] = received_ts
-
-    def push_transcription_message(
-        self, room_id: str, transcription: str, is_utterance: bool, received_ts: float
+    async def push_transcription_message(
+        self,
+        room_id: str,
+        transcription: str,
+        is_utterance: bool,
+        received_ts: float,
+        debug: dict | None = None,
     ):
-        if not is_utterance and received_ts < self.rooms[room_id].last_transcription_ts:
-            return
-
-        utterance_id = self.rooms[room_id].utterance_id
+        utterance_id = await self.get_utterance_id(room_id)
         transcription_message = TranscriptionMessage(
             committed=transcription if is_utterance else None,
             volatile=transcription,
             utterance_id=utterance_id,
+            debug=debug,
         )
 
-        room = self.rooms[room_id]
-        for client_id in room.transcription_subscribers:
-            room.client_queues[client_id].put_nowait(transcription_message)
+        await self._publish(room_id, transcription_message, is_utterance, received_ts)
+
+        if transcription_message.committed:
+            await self.broker.incr(self._utterance_id_key(room_id))
+
+    async def _publish(
+        self,
+        room_id: str,
+        message: TranscriptionMessage | TranslationMessage,
+        is_utterance: bool,
+        received_ts: float,
+    ):
+        payload = asdict(message)
+        if payload["debug"] is None:
+            del payload["debug"]
+
+        # Numbered by the broker together with logging and publishing, so
+        # events from every worker share one order. The counter is per room
+        # rather than per stream, as listeners of several streams merge them
+        # by id
+        event = json.dumps(
+            {
+                "message": payload,
+                "is_utterance": is_utterance,
+                "received_ts": received_ts,
+                "published_ts": time.time(),
+            }
+        )
+        await self.broker.publish_event(
+            self._event_id_key(room_id),
+            self._history_key(room_id),
+            self._channel(room_id),
+            settings.room_event_log_size,
+            event,
+        )
 
-        self.rooms[room_id].last_transcription_ts = received_ts
-        if transcription_message["committed"]:
-            room.utterance_id += 1
+    async def _relay_room_events(self, room_id: str, room: Room):
+        subscription = await self.broker.subscribe(self._channel(room_id))
+        try:
+            # Subscribe before reading the history so nothing falls in between
+            backfilled_id = 0
+            for raw_event in await self.broker.lrange(
+                self._history_key(room_id), 0, -1
+            ):
+                event = json.loads(raw_event)
+                self._dispatch(room, event)
+                backfilled_id = max(backfilled_id, event["id"])
+            room.ready.set()
+
+            async for raw_event in subscription:
+                event = json.loads(raw_event)
+                if event["id"] <= backfilled_id:
+                    continue
+                self._dispatch(room, event)
+        finally:
+            room.ready.set()
+            await subscription.close()
+
+    def _dispatch(self, room: Room, event: dict):
+        message: dict = event["message"]
+        is_utterance: bool = event["is_utterance"]
+        received_ts: float = event["received_ts"]
+
+        event_type: Literal["translation", "transcription"]
+        if "language_code" in message:
+            stream = message["language_code"]
+            event_type = "translation"
+        else:
+            stream = TRANSCRIPTION_STREAM
+            event_type = "transcription"
+
+        # Every stream is kept while the room has listeners here, even ones
+        # nobody reads right now, so a client resuming one can catch up. The
+        # logs are bounded and there are only so many languages
+        channel = room.get_channel(stream)
+
+        # Volatile results can be overtaken by newer ones; drop them when late.
+        if not is_utterance and received_ts < channel.last_ts:
+            return
+        channel.last_ts = received_ts
 
-    def unsubscribe_from_room(self, room_id: str, client_id: str):
+        # Encode once for every listener and for later replays
+        encoded = create_sse_response(event_type, message, event_id=event["id"])
+        channel.append(LoggedEvent(event["id"], encoded, event["published_ts"]))
+
+    async def unsubscribe_from_room(self, room_id: str, client_id: str):
         room = self.rooms[room_id]
-        room.transcription_subscribers.discard(client_id)
-        for lang_dict in room.translations.values():
-            lang_dict["client_ids"].discard(client_id)
-        room.client_queues.pop(client_id)
+        await room.subscriptions.remove(client_id)
+
+        if not room.subscriptions.client_streams:
+            if room.relay_task is not None:
+                room.relay_task.cancel()
+            del self.rooms[room_id]
 
 
 class RoomsService:
     def __init__(
         self,
-        transcription_service: TranscriptionService,
+        transcription_service: BaseRemoteTranscriptionService,
         translation_service: BaseRemoteTranslationService,
         sse_manager: SSEManager,
+        translators: IncrementalTranslators,
+        transcription_hedger: Hedger | None = None,
+        translation_hedger: Hedger | None = None,
+        transcription_limiter: AdaptiveLimiter | None = None,
+        stabilizers: TranscriptStabilizers | None = None,
+        fallback_translation_service: BaseRemoteTranslationService | None = None,
     ):
         self.transcription_service = transcription_service
         self.translation_service = translation_service
         self.sse_manager = sse_manager
+        self.translators = translators
+        self.transcription_hedger = transcription_hedger
+        self.translation_hedger = translation_hedger
+        self.transcription_limiter = transcription_limiter
+        self.stabilizers = stabilizers
+        # Backs up slow committed translations instead of the service itself
+        self.fallback_translation_service = fallback_translation_service
+
+    async def get_all_rooms(self) -> list[str]:
+        return await self.sse_manager.get_room_ids()
+
+    async def get_room(self, room_id: str) -> bool:
+        return await self.sse_manager.room_exists(room_id)
+
+    def get_scheduling_stats(self, room_id: str) -> dict[str, float] | None:
+        """Transcription wait times of a room on this worker, if it sent audio."""
+        if self.transcription_limiter is None:
+            return None
+        return self.transcription_limiter.scheduler.get_stats(room_id)
+
+    async def get_audio_offset(self, room_id: str, utterance: int | None) -> int:
+        """
+        Sample of utterance number `utterance` from which audio is still
+        needed. Until the previous utterance has been transcribed, the
+        committed words are still that one's, so the whole audio is needed.
+        """
+        if self.stabilizers is None or utterance is None:
+            return 0
+        stabilizer = await self.stabilizers.get(room_id)
+        if stabilizer.generation != utterance:
+            return 0
+        return stabilizer.offset
+
+    async def process_audio(
+        self,
+        audio_data: bytes,
+        room_id: str,
+        is_utterance: bool,
+        trace: Trace | None = None,
+        offset: int = 0,
+        utterance: int | None = None,
+    ):
+        """
+        Transcribe and translate a chunk of audio, which starts `offset`
+        samples into utterance number `utterance` of the room, or into the
+        current one if the client does not count them.
+        """
+        if trace is None:
+            trace = Trace()
+
+        generation = utterance or 0
+        if self.stabilizers is not None and utterance is None:
+            generation = (await self.stabilizers.get(room_id)).generation
 
-    def get_all_rooms(self) -> list[str]:
-        return list(self.sse_manager.rooms.keys())
-
-    def get_room(self, room_id: str) -> bool:
-        return room_id in self.sse_manager.rooms
-
-    async def process_audio(self, audio_data: bytes, room_id: str, is_utterance: bool):
         try:
             received_ts = time.time()
-            transcription = await self.transcription_service.transcribe(audio_data)
-            current_utterance_id = self.sse_manager.rooms[room_id].utterance_id
-            self.sse_manager.push_transcription_message(
-                room_id,
-                transcription,
-                is_utterance,
-                received_ts,
+            trace.add_span("queue", trace.start_ts, received_ts - trace.start_ts)
+            if self.transcription_limiter is not None:
+                # Set when the room was created, on whichever worker that was
+                self.transcription_limiter.scheduler.set_weight(
+                    room_id, await self.sse_manager.get_room_weight(room_id)
+                )
+            # Waits for a slot, a newer volatile chunk of the room may replace
+            # this one in the meantime
+            slot = (
+                self.transcription_limiter.slot(
+                    room_id, len(audio_data) / BYTES_PER_SECOND, is_utterance
+                )
+                if self.transcription_limiter is not None
+                else nullcontext()
             )
+            async with slot:
+                with (
+                    IN_FLIGHT.labels("asr").track_inprogress(),
+                    STAGE_LATENCY.labels("asr", "").time(),
+                    track_upstream("transcription"),
+                    trace.span("asr"),
+                ):
+                    transcribe = partial(
+                        self.transcription_service.transcribe_words,
+                        audio_data,
+                        trace,
+                        is_utterance,
+                    )
+                    # Only committed utterances are worth the extra load
+                    if is_utterance and self.transcription_hedger is not None:
+                        transcription, words = await self.transcription_hedger.run(
+                            transcribe
+                        )
+                    else:
+                        transcription, words = await transcribe()
+
+            newly_committed = 0
+            if self.stabilizers is not None and words is not None:
+                # Loaded again, other chunks may have updated it meanwhile
+                stabilizer = await self.stabilizers.get(room_id)
+                start = offset / SAMPLE_RATE
+                transcription, newly_committed = stabilizer.update(
+                    words,
+                    start,
+                    start + len(audio_data) / BYTES_PER_SECOND,
+                    is_utterance,
+                    generation,
+                    # Words of the fast model are only good enough to show
+                    commit=is_utterance or not settings.asr_fast_volatile,
+                )
+                await self.stabilizers.save(room_id, stabilizer)
+            current_utterance_id = await self.sse_manager.get_utterance_id(room_id)
+            with STAGE_LATENCY.labels("enqueue", "").time():
+                await self.sse_manager.push_transcription_message(
+                    room_id,
+                    transcription,
+                    is_utterance,
+                    received_ts,
+                    debug=self._debug_fields(trace),
+                )
+            ENQUEUE_AGE.labels("transcription").observe(time.time() - trace.start_ts)
 
-            target_language_codes = self.sse_manager.get_subscribed_language_codes(
+            listener_counts = await self.sse_manager.get_language_listener_counts(
                 room_id
             )
 
-            for lang_code in target_language_codes:
-                received_ts = time.time()
-                translation_result = await self.translation_service.translate(
-                    transcription, lang_code
-                )
-
-                self.sse_manager.push_translation_message(
-                    room_id,
-                    current_utterance_id,
-                    translation_result,
+            translators = []
+            for lang_code, listeners in listener_counts.items():
+                translator = self.translators.get(room_id, lang_code)
+                characters = translator.pending_characters(transcription)
+                # Committed utterances and newly stable words are always
+                # translated right away
+                if (
+                    not is_utterance
+                    and not newly_committed
+                    and not translator.throttle.should_translate(characters, listeners)
+                ):
+                    VOLATILE_TRANSLATIONS_SKIPPED.labels(lang_code).inc()
+                    continue
+                translators.append((translator, characters))
+
+            if not translators:
+                return
+
+            # All languages are translated together, one request per sentence
+            received_ts = time.time()
+            with (
+                IN_FLIGHT.labels("translate").track_inprogress(),
+                track_upstream("translation"),
+                trace.span("translate"),
+                ExitStack() as throttles,
+            ):
+                for translator, characters in translators:
+                    throttles.enter_context(translator.throttle.track(characters))
+                translations = await translate_incrementally(
+                    self.translation_service,
+                    [translator for translator, _ in translators],
+                    transcription,
                     is_utterance,
-                    language_code=lang_code,
-                    received_ts=received_ts,
+                    hedger=self.translation_hedger if is_utterance else None,
+                    fallback_service=self.fallback_translation_service,
                 )
+            translate_time = time.time() - received_ts
+
+            for lang_code, translation_result in translations.items():
+                STAGE_LATENCY.labels("translate", lang_code).observe(translate_time)
+                with STAGE_LATENCY.labels("enqueue", lang_code).time():
+                    await self.sse_manager.push_translation_message(
+                        room_id,
+                        current_utterance_id,
+                        translation_result,
+                        is_utterance,
+                        language_code=lang_code,
+                        received_ts=received_ts,
+                        debug=self._debug_fields(trace, "translate"),
+                    )
+                ENQUEUE_AGE.labels("translation").observe(time.time() - trace.start_ts)
+        except WorkShed:
+            pass
         except Exception as e:
             print(e)
+        finally:
+            await trace.export(room_id=room_id, is_utterance=is_utterance)
 
-    async def listen_to_room(self, room_id: str, target_lang: list[str] | None = None):
-        if room_id not in self.sse_manager.rooms:
-            raise HTTPException(status_code=404, detail="Room not found.")
+    @staticmethod
+    def _debug_fields(trace: Trace, *span_prefixes: str) -> dict | None:
+        if not settings.trace_debug_events:
+            return None
+        return trace.debug_fields("queue", "asr", *span_prefixes)
 
+    async def listen_to_room(
+        self,
+        room_id: str,
+        target_lang: list[str] | None = None,
+        last_event_id: int | None = None,
+    ):
         client_id = str(uuid.uuid4())
 
-        self.sse_manager.subscribe_to_room(room_id, client_id, target_lang)
+        listener = await self.sse_manager.subscribe_to_room(
+            room_id, client_id, target_lang, last_event_id=last_event_id
+        )
 
         async def event_generator():
             try:
-                while True:
-                    # Wait for new messages in the queue
-                    message = (
-                        await self.sse_manager.rooms[room_id]
-                        .client_queues[client_id]
-                        .get()
-                    )
-
-                    print(message)
-
-                    yield create_sse_response(
-                        "translation"
-                        if "language_code" in message
-                        else "transcription",
-                        message,
-                    )
+                # Spread out reconnects so a dropped venue network does not
+                # bring every phone back at the same instant
+                yield create_sse_retry(
+                    settings.sse_retry_ms + random.randint(0, settings.sse_retry_ms)
+                )
 
-            except asyncio.CancelledError:
-                # Client disconnected
-                self.sse_manager.unsubscribe_from_room(room_id, client_id)
+                replaying = last_event_id is not None
+                while True:
+                    # Wait for new events on the room's broadcast channels
+                    events = await listener.next_events()
+                    yield "".join(event.encoded for event in events)
+
+                    # Replayed events say nothing about live delivery latency
+                    if not replaying:
+                        STAGE_LATENCY.labels("flush", "").observe(
+                            time.time() - events[0].published_ts
+                        )
+                        LISTENER_BACKLOG.observe(len(events))
+                    replaying = False
+
+            finally:
+                # Client disconnected, seen either as a cancellation or as
+                # the response closing the stream
+                await self.sse_manager.unsubscribe_from_room(room_id, client_id)
                 print(f"Client disconnected from room: {room_id}")
 
         return event_generator
@@ -0,0 +1,146 @@
+import json
+import re
+
+from app.services.broker import BaseBroker
+from app.services.transcription import Word
+
+SAMPLE_RATE = 16000
+# Words ending this close to the end of the audio may still change
+UNSTABLE_TAIL_S = 0.5
+
+NON_WORD = re.compile(r"[^\w']+")
+
+
+def _normalize(word: str) -> str:
+    return NON_WORD.sub("", word).lower()
+
+
+def _join(*word_lists: list[Word]) -> str:
+    return " ".join(word["word"] for words in word_lists for word in words)
+
+
+class TranscriptStabilizer:
+    """
+    Commits the part of a growing utterance that the ASR has settled on.
+
+    Like `TranscriptionBuffer` in `websocket.py`, a word is committed once
+    two consecutive hypotheses agree on it, in order from the start of the
+    utterance. Committed words are never revised, their audio no longer has
+    to be sent or transcribed again, and `offset` tells the client from which
+    sample of the utterance it still has to send audio.
+    """
+
+    __slots__ = ("committed", "hypothesis", "audio_end", "generation")
+
+    def __init__(self) -> None:
+        self.committed: list[Word] = []
+        self.hypothesis: list[Word] = []
+        self.audio_end = 0.0
+        # Number of the current utterance in the room, so late partials of the
+        # last one are ignored
+        self.generation = 0
+
+    def to_json(self) -> str:
+        return json.dumps({name: getattr(self, name) for name in self.__slots__})
+
+    @classmethod
+    def from_json(cls, raw: str) -> "TranscriptStabilizer":
+        stabilizer = cls()
+        for name, value in json.loads(raw).items():
+            setattr(stabilizer, name, value)
+        return stabilizer
+
+    @property
+    def committed_end(self) -> float:
+        return self.committed[-1]["end"] if self.committed else 0.0
+
+    @property
+    def offset(self) -> int:
+        return int(self.committed_end * SAMPLE_RATE)
+
+    def update(
+        self,
+        words: list[Word],
+        start: float,
+        end: float,
+        is_utterance: bool,
+        generation: int,
+        commit: bool = True,
+    ) -> tuple[str, int]:
+        """
+        Add the words transcribed from the audio between `start` and `end`
+        seconds of the utterance. Returns the full text of the utterance and
+        the number of words that were committed by this update. Words of a
+        partial are only shown, not committed, unless `commit` is set.
+        """
+        if is_utterance and generation > self.generation:
+            # The last chunk of an earlier utterance was lost, the words
+            # committed so far were that one's
+            self.committed, self.hypothesis = [], []
+            self.audio_end = 0.0
+            self.generation = generation
+        if generation != self.generation:
+            # Sent around the end of another utterance, so it can't be placed
+            return _join(words), 0
+        if not is_utterance and end < self.audio_end:
+            # An older partial finished late, keep the newer state
+            return _join(self.committed, self.hypothesis), 0
+
+        committed_end = self.committed_end
+        words = [
+            {**word, "start": word["start"] + start, "end": word["end"] + start}
+            for word in words
+        ]
+        # Audio before the offset may have been sent again, its words are
+        # already committed
+        words = [
+            word for word in words if (word["start"] + word["end"]) / 2 > committed_end
+        ]
+
+        if is_utterance:
+            text = _join(self.committed, words)
+            self.committed, self.hypothesis = [], []
+            self.audio_end = 0.0
+            self.generation += 1
+            return text, len(words)
+
+        agreed = 0
+        for previous, word in zip(self.hypothesis if commit else [], words):
+            if (
+                _normalize(previous["word"]) != _normalize(word["word"])
+                or word["end"] > end - UNSTABLE_TAIL_S
+            ):
+                break
+            agreed += 1
+        self.committed.extend(words[:agreed])
+        self.hypothesis = words[agreed:]
+        self.audio_end = end
+        return _join(self.committed, self.hypothesis), agreed
+
+
+def stabilizer_key(room_id: str) -> str:
+    return f"room:{room_id}:stabilizer"
+
+
+class TranscriptStabilizers:
+    """
+    Stabilizer state of each room, kept in the broker.
+
+    A room's chunks can be posted to any worker, so every worker has to
+    continue from the same committed words and hand out the same offset.
+    The state is loaded and saved around each update. Updates of a room
+    racing on two workers can lose a hypothesis, which only delays a
+    commit to the next chunk.
+    """
+
+    def __init__(self, broker: BaseBroker):
+        self.broker = broker
+
+    async def get(self, room_id: str) -> TranscriptStabilizer:
+        raw = await self.broker.get_value(stabilizer_key(room_id))
+        if raw is None:
+            return TranscriptStabilizer()
+        return TranscriptStabilizer.from_json(raw)
+
+    async def save(self, room_id: str, stabilizer: TranscriptStabilizer):
+        await self.broker.set_value(stabilizer_key(room_id), stabilizer.to_json())
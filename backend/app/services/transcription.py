@@ -1,16 +1,43 @@
 from abc import ABC, abstractmethod
-from typing import TypedDict
+import asyncio
+import time
+from typing import NotRequired, TypedDict
 import httpx
 import numpy as np
 from numpy.typing import NDArray
 from app.config import settings
+from app.lib.limiter import UpstreamBackoff, UpstreamOverloaded
+from app.lib.metrics import TRANSCRIPTION_SHED
+from app.lib.scheduler import WorkShed
+from app.lib.tracing import Trace
 import google.oauth2.id_token
 import google.auth.transport.requests
 
 
+class Word(TypedDict):
+    word: str
+    # Seconds from the start of the audio
+    start: float
+    end: float
+    confidence: NotRequired[float]
+
+
 class BaseRemoteTranscriptionService(ABC):
     @abstractmethod
-    async def transcribe(self, audio_data: bytes) -> str:
+    async def transcribe(self, audio_data: bytes, trace: Trace | None = None) -> str:
+        pass
+
+    async def transcribe_words(
+        self, audio_data: bytes, trace: Trace | None = None, is_utterance: bool = True
+    ) -> tuple[str, list[Word] | None]:
+        """
+        Transcribe with word timestamps, if the upstream provides them.
+        Volatile chunks (not `is_utterance`) may be shed with `WorkShed`.
+        """
+        return await self.transcribe(audio_data, trace), None
+
+    async def wake_up(self):
+        """Make sure the upstream is warm before audio arrives."""
         pass
 
 
@@ -77,11 +104,21 @@ class BaseTranscriptionService(ABC):
 #         self.model = onnx_asr.load_model(self.model_name)
 
 
+def _parse_retry_after(response: httpx.Response) -> float:
+    """Seconds to wait from a `Retry-After` header, 1 if it has none."""
+    try:
+        return max(float(response.headers.get("retry-after", 1)), 0.0)
+    except ValueError:
+        # An HTTP date, which the transcription service doesn't send
+        return 1.0
+
+
 class GCPTranscriptionService(BaseRemoteTranscriptionService):
-    def __init__(self, http_client: httpx.AsyncClient):
+    def __init__(self, http_client: httpx.AsyncClient, backoff: UpstreamBackoff):
         self.http_client = http_client
         self.url = settings.transcription_url
         self.id_token = self._get_id_token()
+        self.backoff = backoff
 
     def _get_id_token(self):
         auth_req = google.auth.transport.requests.Request()
@@ -94,17 +131,65 @@ class GCPTranscriptionService(BaseRemoteTranscriptionService):
             "Content-Type": "application/octet-stream",
         }
 
-    async def transcribe(self, audio_data: bytes) -> str:
-        response = await self.http_client.post(
-            self.url + "/transcribe",
-            headers=self._get_headers(),
-            content=audio_data,
-            timeout=None,
-        )
+    async def _post_audio(
+        self,
+        audio_data: bytes,
+        trace: Trace | None,
+        params: dict | None = None,
+        is_utterance: bool = True,
+    ) -> dict:
+        if not is_utterance and self.backoff.active():
+            TRANSCRIPTION_SHED.labels("backoff").inc()
+            raise WorkShed()
+
+        headers = self._get_headers()
+        if trace is not None:
+            headers.update(trace.headers())
+
+        for attempt in range(2):
+            response = await self.http_client.post(
+                self.url + "/transcribe",
+                headers=headers,
+                content=audio_data,
+                params=params,
+            )
+            if trace is not None:
+                trace.add_server_timing(
+                    "asr", response.headers.get("server-timing"), time.time()
+                )
+            if response.status_code != 429:
+                break
+            # Rejected by admission control, the work would miss its deadline
+            retry_after = _parse_retry_after(response)
+            self.backoff.back_off(retry_after)
+            if not is_utterance:
+                # A newer chunk will replace it anyway
+                TRANSCRIPTION_SHED.labels("rejected").inc()
+                raise UpstreamOverloaded()
+            if attempt > 0 or retry_after > settings.asr_max_retry_after_s:
+                break
+            await asyncio.sleep(retry_after)
+        # Overload statuses feed the adaptive concurrency limit
+        response.raise_for_status()
         print(f"Transcription response: {response.json()}")
-        return response.json()["text"]
+        return response.json()
+
+    async def transcribe(self, audio_data: bytes, trace: Trace | None = None) -> str:
+        return (await self._post_audio(audio_data, trace))["text"]
+
+    async def transcribe_words(
+        self, audio_data: bytes, trace: Trace | None = None, is_utterance: bool = True
+    ) -> tuple[str, list[Word] | None]:
+        params = {"timestamps": "true"}
+        if not is_utterance and settings.asr_fast_volatile:
+            # Replaced within a second, so speed matters more than accuracy
+            params["tier"] = "fast"
+        result = await self._post_audio(audio_data, trace, params, is_utterance)
+        # Older deployments of the service ignore the parameter
+        return result["text"], result.get("words")
 
     async def wake_up(self):
+        # A cold start can take minutes, well past the usual read timeout
         res = await self.http_client.get(
             self.url + "/status", headers=self._get_headers(), timeout=None
         )
@@ -1,89 +1,114 @@
+import asyncio
 from abc import ABC, abstractmethod
 
 from app.config import settings
 import httpx
 
-# default_model_name = "facebook/nllb-200-distilled-600M"
+# DeepL-style codes that Azure spells differently
+DEEPL_TO_AZURE_LANGUAGE_CODES = {
+    "en-gb": "en",
+    "en-us": "en",
+    "pt-br": "pt",
+    "zh": "zh-Hans",
+    "zh-hans": "zh-Hans",
+    "zh-hant": "zh-Hant",
+}
 
 
 class BaseRemoteTranslationService(ABC):
     @abstractmethod
-    async def translate(self, text: str, language_code: str) -> str:
+    async def translate(
+        self, text: str, language_code: str, context: str | None = None
+    ) -> str:
+        """
+        Translate `text` from English. `context` is preceding text that may
+        inform the translation but is not translated itself.
+        """
         pass
 
+    async def translate_many(
+        self, text: str, language_codes: list[str], context: str | None = None
+    ) -> dict[str, str]:
+        """
+        Translate `text` into several languages. Services whose API accepts
+        multiple targets override this to make a single request.
+        """
+        translations = await asyncio.gather(
+            *(
+                self.translate(text, language_code, context=context)
+                for language_code in language_codes
+            )
+        )
+        return dict(zip(language_codes, translations))
+
     @abstractmethod
-    async def get_supported_languages(self) -> list[str]:
+    async def get_supported_languages(self) -> list[dict[str, str]]:
         pass
 
 
-# class NLLBService:
-#     def __init__(
-#         self,
-#         model_name: str | None = None,
-#         model: Pipeline | None = None,
-#     ):
-#         self.model_name: str | None = None
-#         self.model: Pipeline | None = None
-#         if model_name is None and model is None:
-#             raise ValueError("Either model_name or model must be provided")
-#         if model_name is not None and model is not None:
-#             raise ValueError("Only one of model_name or model must be provided")
-#         if model_name is not None:
-#             if model_name != default_model_name:
-#                 raise ValueError(f"Only {default_model_name} is supported")
-#             self.model_name = model_name
-#             self.model = None
-#         else:
-#             self.model_name = None
-#             self.model = model
-
-#     def translate(self, text: str, language_code: NLLB_LANGUAGE_CODES) -> str:
-#         if self.model is None:
-#             self.load_model()
-
-#         if self.model is None:
-#             raise RuntimeError("Failed to load model")
-
-#         translated_text = self.model(text, src_lang="eng_Latn", tgt_lang=language_code)
-
-#         return str(translated_text[0]["translation_text"])
-
-#     def load_model(self):
-#         if self.model_name is None:
-#             raise ValueError("model_name must be provided")
-#         self.model = pipeline("translation", model=self.model_name)
-
-
 class AzureTranslationService(BaseRemoteTranslationService):
     def __init__(self, http_client: httpx.AsyncClient):
         self.client = http_client
         self.api_key = settings.azure_translate_api_key
         self.api_url = settings.azure_translate_url
+        if self.api_key is None:
+            raise ValueError("AZURE_TRANSLATE_API_KEY must be set to use Azure")
+        self.headers = {"Ocp-Apim-Subscription-Key": self.api_key}
+        # Only required for regional and multi-service resources
+        if settings.azure_region is not None:
+            self.headers["Ocp-Apim-Subscription-Region"] = settings.azure_region
 
     async def translate(
         self,
         text: str,
-        language_codes: str | list[str],
+        language_code: str,
+        context: str | None = None,
     ) -> str:
+        translations = await self.translate_many(text, [language_code])
+        return translations[language_code]
+
+    async def translate_many(
+        self, text: str, language_codes: list[str], context: str | None = None
+    ) -> dict[str, str]:
+        # Azure returns every target language of a request in one response
+        azure_codes = {
+            DEEPL_TO_AZURE_LANGUAGE_CODES.get(code.lower(), code): code
+            for code in language_codes
+        }
         params = {
             "api-version": "3.0",
             "from": "en",
-            "to": language_codes,
+            "to": list(azure_codes),
         }
 
-        async with httpx.AsyncClient() as client:
-            res = await client.post(
-                self.api_url,
-                params=params,
-                headers={
-                    "Ocp-Apim-Subscription-Key": self.api_key,
-                    "Ocp-Apim-Subscription-Region": settings.azure_region,
-                },
-                json=[{"text": text}],
-            )
+        res = await self.client.post(
+            self.api_url + "/translate",
+            params=params,
+            headers=self.headers,
+            json=[{"text": text}],
+        )
+        res.raise_for_status()
 
-        translation = res.json()[0]["translations"][0]["text"]
-        return translation
+        translations = {
+            translation["to"].lower(): translation["text"]
+            for translation in res.json()[0]["translations"]
+        }
+        return {
+            code: translations[azure_code.lower()]
+            for azure_code, code in azure_codes.items()
+        }
+
+    async def get_supported_languages(self) -> list[dict[str, str]]:
+        res = await self.client.get(
+            self.api_url + "/languages",
+            params={"api-version": "3.0", "scope": "translation"},
+        )
+        res.raise_for_status()
+
+        return [
+            {"code": code.lower(), "name": language["name"]}
+            for code, language in res.json()["translation"].items()
+        ]
 
 
 class DeepLTranslationService(BaseRemoteTranslationService):
@@ -99,23 +124,27 @@ class DeepLTranslationService(BaseRemoteTranslationService):
         self,
         text: str,
         language_code: str,
+        context: str | None = None,
     ) -> str:
+        body = {
+            "text": [text],
+            "target_lang": language_code,
+            "source_lang": "en",
+        }
+        if context:
+            body["context"] = context
+
         res = await self.client.post(
             self.api_url + "/translate",
             headers=self.headers,
-            json={
-                "text": [text],
-                "target_lang": language_code,
-                "source_lang": "en",
-            },
-            timeout=None,
+            json=body,
         )
 
         print(res.json())
         translation = res.json().get("translations", [])[0].get("text", "")
         return translation
 
-    async def get_supported_languages(self):
+    async def get_supported_languages(self) -> list[dict[str, str]]:
         res = await self.client.get(
             self.api_url + "/languages",
             params={"type": "target"},
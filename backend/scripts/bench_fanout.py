@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the rooms fan-out path.
+
+Runs `SSEManager` and `RoomsService` in-process against the in-memory broker
+and the fake upstreams, so it needs neither DeepL credentials nor a GPU.
+For each subscriber count and number of languages it reports the cost of a
+publish, the time until every listener has read the event, the per-event
+encode cost and the memory held per subscriber.
+
+Save a baseline on a known good commit and compare later runs against it to
+catch fan-out regressions:
+
+    python scripts/bench_fanout.py --save baseline.json
+    python scripts/bench_fanout.py --baseline baseline.json
+
+The benchmarks live in `app/lib/fanout_benchmark.py`. `tests/test_fanout.py`
+runs a small configuration of them against fixed bounds.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+# Settings are read at import time, none of these are contacted
+os.environ.setdefault("DEEPL_API_KEY", "unused")
+os.environ.setdefault("DEEPL_URL", "http://localhost")
+os.environ.setdefault("TRANSCRIPTION_URL", "http://localhost")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.lib.fanout_benchmark import (  # noqa: E402
+    LANGUAGES,
+    bench_encode,
+    bench_fanout,
+    bench_process_audio,
+)
+
+
+async def main(args) -> int:
+    results = {"encode_us": bench_encode(args.encode_iterations) * 1e6}
+    print(f"encode: {results['encode_us']:.2f}us/event")
+
+    results["process_audio_us"] = (
+        await bench_process_audio(max(args.languages), args.chunks) * 1e6
+    )
+    print(
+        f"process_audio ({max(args.languages)} languages): "
+        f"{results['process_audio_us']:.0f}us/chunk"
+    )
+
+    print(
+        f"\n{'subscribers':>11} {'languages':>9} {'publish':>10} "
+        f"{'delivery':>10} {'per read':>10} {'memory':>10}"
+    )
+    for subscribers in args.subscribers:
+        for languages in args.languages:
+            result = await bench_fanout(subscribers, languages, args.events)
+            results[f"fanout_{subscribers}x{languages}"] = result
+            print(
+                f"{subscribers:>11} {languages:>9} "
+                f"{result['publish_us']:>8.1f}us "
+                f"{result['delivery_us']:>8.0f}us "
+                f"{result['per_listener_ns']:>8.0f}ns "
+                f"{result['bytes_per_subscriber']:>9.0f}B"
+            )
+
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        return compare(results, json.loads(Path(args.baseline).read_text()), args)
+    return 0
+
+
+def compare(results: dict, baseline: dict, args) -> int:
+    """Report every measurement that is worse than the baseline allows."""
+
+    def flatten(values: dict, prefix: str = "") -> dict[str, float]:
+        flat = {}
+        for key, value in values.items():
+            if isinstance(value, dict):
+                flat.update(flatten(value, f"{prefix}{key}."))
+            else:
+                flat[prefix + key] = value
+        return flat
+
+    current, previous = flatten(results), flatten(baseline)
+    regressions = [
+        f"{name}: {current[name]:.1f} vs {previous[name]:.1f}"
+        for name in current.keys() & previous.keys()
+        if current[name] > previous[name] * args.tolerance
+    ]
+    if regressions:
+        print(f"\nRegressions beyond {args.tolerance}x the baseline:")
+        for regression in sorted(regressions):
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions beyond {args.tolerance}x the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rooms fan-out path")
+    parser.add_argument(
+        "--subscribers",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000],
+        help="Subscriber counts to benchmark",
+    )
+    parser.add_argument(
+        "--languages",
+        type=int,
+        nargs="+",
+        default=[1, 5, 10],
+        help="Numbers of target languages to spread subscribers over",
+    )
+    parser.add_argument(
+        "--events",
+        type=int,
+        default=20,
+        help="Utterance updates published per fan-out run",
+    )
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        default=200,
+        help="Audio chunks processed in the process_audio benchmark",
+    )
+    parser.add_argument(
+        "--encode-iterations",
+        type=int,
+        default=100000,
+        help="Events encoded in the encode benchmark",
+    )
+    parser.add_argument("--save", type=str, help="Write the results to this file")
+    parser.add_argument(
+        "--baseline", type=str, help="Compare the results against this file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.5,
+        help="Allowed slowdown against the baseline before failing",
+    )
+
+    args = parser.parse_args()
+    if max(args.languages) > len(LANGUAGES):
+        parser.error(f"At most {len(LANGUAGES)} languages are supported")
+
+    exit(asyncio.run(main(args)))
@@ -1,62 +1,425 @@
 #!/usr/bin/env python3
+"""
+Load generator for the rooms API.
+
+Creates a number of rooms, streams an audio file into each one in real time
+using the same volatile/utterance pattern as the frontend and attaches SSE
+listeners to every room. At the end it reports end-to-end latency, missing
+and out-of-order events and the server's resource usage from `/metrics`.
+
+End-to-end latency needs per-event timings, so run the backend with
+`TRACE_DEBUG_EVENTS=true`. The load generator and the server should run on
+the same host, or at least have synchronised clocks.
+"""
+
+import argparse
 import asyncio
+import json
 import os
 import time
-import requests
-import soundfile as sf
-import numpy as np
-import argparse
+from dataclasses import dataclass, field
 from pathlib import Path
-import librosa
 
+import httpx
+import librosa
+import numpy as np
+import soundfile as sf
+from prometheus_client.parser import text_string_to_metric_families
 
-def create_room(url):
-    response = requests.post(url)
-    return response.json()["room_id"]
+SAMPLE_RATE = 16000
+# Audio is posted as 16-bit PCM
+BYTES_PER_SAMPLE = 2
+# Frame size used by the frontend's VAD
+CHUNK_SIZE = 512
 
 
-def stream_audio(url, chunk_duration=1):
-    # Load the audio file
-    audio_data, sample_rate = sf.read(audio_path)
+def load_audio(audio_path: Path) -> np.ndarray:
+    """Load an audio file as 16 kHz mono float32 samples."""
+    audio_data, sample_rate = sf.read(audio_path, dtype="float32")
 
     # Convert to mono if stereo
     if len(audio_data.shape) > 1:
         audio_data = audio_data.mean(axis=1)
 
     # Resample to 16kHz if needed
-    if sample_rate != 16000:
+    if sample_rate != SAMPLE_RATE:
         audio_data = librosa.resample(
-            y=audio_data, orig_sr=sample_rate, target_sr=16000
+            y=audio_data, orig_sr=sample_rate, target_sr=SAMPLE_RATE
+        )
+
+    return audio_data
+
+
+class UtteranceSegmenter:
+    """Port of the frontend's `UtteranceSegmenter`."""
+
+    def __init__(
+        self,
+        speech_prob_threshold: float = 0.8,
+        silence_duration: float = 0.7,
+        update_interval: float | None = None,
+    ):
+        self.speech_prob_threshold = speech_prob_threshold
+        self.silence_duration = silence_duration
+        self.update_interval = update_interval
+        self.audio_buffer = np.zeros(0, dtype=np.float32)
+        self.last_speech_loc = 0
+        self.contains_speech = False
+
+    def process(
+        self, audio_chunk: np.ndarray, speech_prob: float
+    ) -> tuple[np.ndarray, bool] | None:
+        """Return the audio to post and whether it is an utterance, if any."""
+        self.audio_buffer = np.concatenate([self.audio_buffer, audio_chunk])
+
+        if speech_prob >= self.speech_prob_threshold:
+            self.contains_speech = True
+            self.last_speech_loc = len(self.audio_buffer)
+
+        if (
+            len(self.audio_buffer) - self.last_speech_loc
+            >= SAMPLE_RATE * self.silence_duration
+        ):
+            utterance = None
+            if self.contains_speech:
+                utterance = (self.audio_buffer, True)
+                # Keep only the audio data from the last speech location onwards
+                self.audio_buffer = self.audio_buffer[self.last_speech_loc :]
+            else:
+                self.audio_buffer = self.audio_buffer[len(audio_chunk) :]
+            self.contains_speech = False
+            self.last_speech_loc = 0
+            return utterance
+
+        if (
+            self.update_interval
+            and len(self.audio_buffer) % (self.update_interval * SAMPLE_RATE)
+            < CHUNK_SIZE
+            and self.contains_speech
+        ):
+            return self.audio_buffer, False
+
+        return None
+
+
+def speech_prob(audio_chunk: np.ndarray, threshold: float) -> float:
+    """Energy-based stand-in for the frontend's Silero VAD."""
+    rms = float(np.sqrt(np.mean(np.square(audio_chunk))))
+    return 1.0 if rms >= threshold else 0.0
+
+
+@dataclass(slots=True)
+class Post:
+    offset: float
+    audio: bytes
+    is_utterance: bool
+    # Number of utterances posted before this one's
+    utterance: int
+
+
+def segment_audio(audio_data: np.ndarray, args) -> list[Post]:
+    """Split audio into the posts the frontend would send, with their offsets."""
+    segmenter = UtteranceSegmenter(
+        args.speech_threshold, args.silence_duration, args.update_interval
+    )
+    posts = []
+    utterance = 0
+    for i in range(0, len(audio_data) - CHUNK_SIZE + 1, CHUNK_SIZE):
+        chunk = audio_data[i : i + CHUNK_SIZE]
+        result = segmenter.process(chunk, speech_prob(chunk, args.energy_threshold))
+        if result is None:
+            continue
+        audio, is_utterance = result
+        pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16)
+        posts.append(
+            Post((i + CHUNK_SIZE) / SAMPLE_RATE, pcm.tobytes(), is_utterance, utterance)
+        )
+        utterance += is_utterance
+    return posts
+
+
+@dataclass
+class Stats:
+    posts: int = 0
+    post_errors: int = 0
+    post_latency: list[float] = field(default_factory=list)
+    latency: dict[str, list[float]] = field(default_factory=dict)
+    events: dict[str, int] = field(default_factory=dict)
+    untimed_events: int = 0
+    out_of_order: int = 0
+    missing_committed: int = 0
+    listener_errors: int = 0
+
+    def record_event(self, kind: str, latency: float | None):
+        self.events[kind] = self.events.get(kind, 0) + 1
+        if latency is None:
+            self.untimed_events += 1
+        else:
+            self.latency.setdefault(kind, []).append(latency)
+
+
+async def listen(
+    client: httpx.AsyncClient,
+    base_url: str,
+    room_id: str,
+    language: str,
+    stats: Stats,
+    committed: dict[str, set[int]],
+    connected: asyncio.Event,
+):
+    """Consume a room's SSE stream, checking ids and recording latency."""
+    last_id = 0
+    event_id, event_type = None, None
+    try:
+        async with client.stream(
+            "GET",
+            f"{base_url}/rooms/{room_id}/events",
+            params={"target_lang": language},
+            timeout=httpx.Timeout(10, read=None),
+        ) as response:
+            response.raise_for_status()
+            connected.set()
+            async for line in response.aiter_lines():
+                if line.startswith("id:"):
+                    event_id = int(line[3:])
+                elif line.startswith("event:"):
+                    event_type = line[6:].strip()
+                elif line.startswith("data:"):
+                    received_ts = time.time()
+                    message = json.loads(line[5:])
+                    if event_id is not None:
+                        if event_id <= last_id:
+                            stats.out_of_order += 1
+                        last_id = max(last_id, event_id)
+
+                    state = "volatile" if message["committed"] is None else "committed"
+                    debug = message.get("debug")
+                    latency = received_ts - debug["received_ts"] if debug else None
+                    stats.record_event(f"{event_type}.{state}", latency)
+                    if message["committed"] is not None:
+                        committed[event_type].add(message["utterance_id"])
+                    event_id, event_type = None, None
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"Listener for room {room_id} failed: {e!r}")
+        stats.listener_errors += 1
+        connected.set()
+
+
+async def stream_room(
+    client: httpx.AsyncClient,
+    base_url: str,
+    room_id: str,
+    posts: list[Post],
+    stats: Stats,
+    start: float,
+):
+    """
+    Post audio on an absolute schedule so pacing does not drift.
+
+    Like the frontend, audio of an utterance before the offset returned by
+    the server is transcribed for good and not sent again.
+    """
+    loop = asyncio.get_running_loop()
+    # Samples of each utterance that no longer have to be sent
+    offsets: dict[int, int] = {}
+
+    async def send(post: Post):
+        offset = offsets.get(post.utterance, 0)
+        params = {"utterance": post.utterance, "offset": offset}
+        if post.is_utterance:
+            params["is_utterance"] = "true"
+        sent = time.perf_counter()
+        try:
+            response = await client.post(
+                f"{base_url}/rooms/{room_id}",
+                params=params,
+                content=post.audio[offset * BYTES_PER_SAMPLE :],
+                headers={"Content-Type": "application/octet-stream"},
+            )
+            response.raise_for_status()
+            # Responses can arrive out of order, the offset only moves forward
+            offsets[post.utterance] = max(
+                offsets.get(post.utterance, 0), response.json()["offset"]
+            )
+            stats.post_latency.append(time.perf_counter() - sent)
+        except Exception as e:
+            print(f"Post to room {room_id} failed: {e!r}")
+            stats.post_errors += 1
+
+    # Like the frontend, posts are fired without waiting for the previous one
+    sends = []
+    for post in posts:
+        await asyncio.sleep(max(0, start + post.offset - loop.time()))
+        stats.posts += 1
+        sends.append(asyncio.create_task(send(post)))
+    await asyncio.gather(*sends)
+
+
+async def scrape_metrics(client: httpx.AsyncClient, base_url: str) -> dict:
+    response = await client.get(f"{base_url}/metrics")
+    response.raise_for_status()
+    samples = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if not sample.labels:
+                samples[sample.name] = sample.value
+    return samples
+
+
+async def sample_resources(
+    client: httpx.AsyncClient, base_url: str, peaks: dict, interval: float
+):
+    """Track the peak of the server's resource gauges while the test runs."""
+    while True:
+        try:
+            samples = await scrape_metrics(client, base_url)
+        except Exception:
+            samples = {}
+        for name in (
+            "process_resident_memory_bytes",
+            "process_open_fds",
+            "tyny_active_rooms",
+            "tyny_active_listeners",
+        ):
+            if name in samples:
+                peaks[name] = max(peaks.get(name, 0), samples[name])
+        await asyncio.sleep(interval)
+
+
+def percentiles(values: list[float]) -> str:
+    if not values:
+        return "n/a"
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]) * 1000
+    return (
+        f"p50={p50:.0f}ms p90={p90:.0f}ms p99={p99:.0f}ms "
+        f"max={max(values) * 1000:.0f}ms (n={len(values)})"
+    )
+
+
+def report(stats: Stats, args, posts: list[Post], duration: float, usage: dict):
+    utterances = sum(post.is_utterance for post in posts)
+    listeners = args.rooms * args.listeners
+
+    print(f"\nRooms: {args.rooms}, listeners: {listeners}, duration: {duration:.1f}s")
+    print(f"Posts: {stats.posts} sent, {stats.post_errors} failed")
+    print(f"Post acknowledgement: {percentiles(stats.post_latency)}")
+
+    print("\nEnd-to-end latency (audio received to event delivered):")
+    for kind in sorted(stats.events):
+        print(f"  {kind}: {stats.events[kind]} events, ", end="")
+        print(percentiles(stats.latency.get(kind, [])))
+    if stats.untimed_events:
+        print(
+            f"  {stats.untimed_events} events had no timings, "
+            "run the server with TRACE_DEBUG_EVENTS=true"
         )
-        sample_rate = 16000
 
-    # Convert to 16-bit PCM
-    audio_data = (audio_data * 32767).astype(np.int16)
+    print(
+        f"\nCommitted events missing: {stats.missing_committed} "
+        f"(expected {utterances} utterances per stream)"
+    )
+    print(f"Out-of-order events: {stats.out_of_order}")
+    print(f"Listener errors: {stats.listener_errors}")
+
+    if usage:
+        cpu = usage.get("cpu_seconds")
+        print("\nServer resources:")
+        if cpu is not None:
+            print(f"  CPU: {cpu:.1f}s ({cpu / duration * 100:.0f}% of one core)")
+        if "process_resident_memory_bytes" in usage:
+            rss = usage["process_resident_memory_bytes"] / 2**20
+            print(f"  Peak RSS: {rss:.0f} MiB")
+        if "process_open_fds" in usage:
+            print(f"  Peak open fds: {usage['process_open_fds']:.0f}")
+        if "tyny_active_listeners" in usage:
+            print(f"  Peak listeners: {usage['tyny_active_listeners']:.0f}")
+
+
+async def main(args):
+    base_url = args.url or f"http://localhost:{os.getenv('PORT', 3000)}"
+    posts = segment_audio(load_audio(args.audio_path), args)
+    if not posts:
+        print("No speech detected, try lowering --energy-threshold")
+        return
+    utterance_ids = {post_id for post_id, post in enumerate(posts) if post.is_utterance}
+    print(f"{len(posts)} posts per room, {len(utterance_ids)} of them utterances")
 
-    # Calculate chunk size for 1s
-    chunk_samples = int(sample_rate * chunk_duration)
+    languages = args.languages.split(",")
+    stats = Stats()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
 
-    # Stream chunks
-    for i in range(0, len(audio_data), chunk_samples):
-        chunk = audio_data[i : i + chunk_samples]
-        requests.post(url, data=chunk.tobytes())
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await client.get(f"{base_url}/wake-up", timeout=None)
 
-        time.sleep(chunk_duration)  # Wait 1s between chunks
+        room_ids = []
+        for _ in range(args.rooms):
+            response = await client.post(f"{base_url}/rooms/")
+            response.raise_for_status()
+            room_ids.append(response.json()["roomId"])
+
+        # Attach every listener before streaming so no events are missed
+        listeners = []
+        received = []
+        for room_id in room_ids:
+            for i in range(args.listeners):
+                language = languages[i % len(languages)]
+                committed = {"transcription": set(), "translation": set()}
+                connected = asyncio.Event()
+                received.append(committed)
+                listeners.append(
+                    asyncio.create_task(
+                        listen(
+                            client,
+                            base_url,
+                            room_id,
+                            language,
+                            stats,
+                            committed,
+                            connected,
+                        )
+                    )
+                )
+                await connected.wait()
+        print(f"Created {len(room_ids)} rooms with {len(listeners)} listeners")
+
+        usage = {}
+        sampler = asyncio.create_task(
+            sample_resources(client, base_url, usage, args.metrics_interval)
+        )
+        before = await scrape_metrics(client, base_url)
+
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            *(
+                stream_room(client, base_url, room_id, posts, stats, start)
+                for room_id in room_ids
+            )
+        )
+        await asyncio.sleep(args.drain)
+        duration = asyncio.get_running_loop().time() - start
 
+        after = await scrape_metrics(client, base_url)
+        sampler.cancel()
+        for task in listeners:
+            task.cancel()
+        await asyncio.gather(sampler, *listeners, return_exceptions=True)
 
-async def main(audio_path, language):
-    base_url = f"http://localhost:{os.getenv('PORT', 3000)}"
-    create_room_url = f"{base_url}/rooms"
-    room_id = create_room(create_room_url)
-    send_audio_url = f"{base_url}/rooms/{room_id}"
-    print(f"Room ID: {room_id}")
+    if "process_cpu_seconds_total" in after:
+        usage["cpu_seconds"] = (
+            after["process_cpu_seconds_total"] - before["process_cpu_seconds_total"]
+        )
+    for committed in received:
+        for utterances in committed.values():
+            stats.missing_committed += max(0, len(utterance_ids) - len(utterances))
 
-    stream_audio(send_audio_url)
+    report(stats, args, posts, duration, usage)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
-        description="Stream audio file to WebSocket server"
+        description="Stream an audio file into many rooms and measure latency"
     )
     parser.add_argument(
         "filename",
@@ -66,18 +429,70 @@ if __name__ == "__main__":
         help="Name of the audio file in the audio_files folder (defaults to Your_Plans_Gods_Plans.mp3)",
     )
     parser.add_argument(
-        "--language",
+        "--url",
+        type=str,
+        default=None,
+        help="Base URL of the backend (defaults to http://localhost:$PORT)",
+    )
+    parser.add_argument(
+        "--rooms", "-r", type=int, default=1, help="Number of rooms to stream into"
+    )
+    parser.add_argument(
+        "--listeners",
+        "-n",
+        type=int,
+        default=1,
+        help="Number of SSE listeners per room",
+    )
+    parser.add_argument(
+        "--languages",
         "-l",
         type=str,
         default="zh",
-        help="Target language for translation (e.g., 'es' for Spanish, 'fr' for French, defaults to 'zh')",
+        help="Comma separated target languages, assigned to listeners round robin (defaults to 'zh')",
+    )
+    parser.add_argument(
+        "--silence-duration",
+        type=float,
+        default=0.7,
+        help="Seconds of silence that end an utterance",
+    )
+    parser.add_argument(
+        "--update-interval",
+        type=float,
+        default=1,
+        help="Seconds between volatile updates within an utterance",
+    )
+    parser.add_argument(
+        "--speech-threshold",
+        type=float,
+        default=0.5,
+        help="Speech probability threshold",
+    )
+    parser.add_argument(
+        "--energy-threshold",
+        type=float,
+        default=0.01,
+        help="RMS level above which a frame counts as speech",
+    )
+    parser.add_argument(
+        "--drain",
+        type=float,
+        default=5,
+        help="Seconds to wait for outstanding events after the audio ends",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=1,
+        help="Seconds between scrapes of the server's /metrics",
     )
 
     args = parser.parse_args()
-    audio_path = Path("audio_files") / args.filename
+    args.audio_path = Path("audio_files") / args.filename
 
-    if not audio_path.exists():
-        print(f"Error: File {audio_path} not found")
+    if not args.audio_path.exists():
+        print(f"Error: File {args.audio_path} not found")
         exit(1)
 
-    asyncio.run(main(audio_path, args.language))
+    asyncio.run(main(args))
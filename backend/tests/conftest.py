@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+# The settings are read when `app.config` is first imported
+os.environ.setdefault("DEEPL_API_KEY", "test")
+os.environ.setdefault("DEEPL_URL", "http://deepl.invalid")
+os.environ.setdefault("TRANSCRIPTION_URL", "http://transcription.invalid")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,76 @@
+import pytest
+
+from app.services.broker import InMemoryBroker
+from app.services.fakes import FakeTranscriptionService, FakeTranslationService
+from app.services.incremental_translation import IncrementalTranslators
+from app.services.rooms import BYTES_PER_SECOND, RoomsService, SSEManager
+from app.services.stabilizer import TranscriptStabilizers
+
+pytestmark = pytest.mark.anyio
+
+
+def silence(seconds: float) -> bytes:
+    return bytes(int(seconds * BYTES_PER_SECOND))
+
+
+@pytest.fixture
+async def service() -> RoomsService:
+    broker = InMemoryBroker()
+    return RoomsService(
+        FakeTranscriptionService(latency_ms=0, failure_rate=0),
+        FakeTranslationService(latency_ms=0, failure_rate=0),
+        SSEManager(broker),
+        IncrementalTranslators(16),
+        stabilizers=TranscriptStabilizers(broker),
+    )
+
+
+async def test_offset_is_kept_within_an_utterance(service: RoomsService):
+    room_id = await service.sse_manager.create_room()
+    for seconds in (2, 3):
+        await service.process_audio(silence(seconds), room_id, False, utterance=0)
+
+    offset = await service.get_audio_offset(room_id, 0)
+    assert offset > 0
+    # Clients that don't number their utterances always send everything
+    assert await service.get_audio_offset(room_id, None) == 0
+
+
+async def test_next_utterance_right_after_commit_gets_no_offset(
+    service: RoomsService,
+):
+    room_id = await service.sse_manager.create_room()
+    for seconds in (2, 3):
+        await service.process_audio(silence(seconds), room_id, False, utterance=0)
+    assert await service.get_audio_offset(room_id, 0) > 0
+
+    # Utterance 0 ended and utterance 1 starts before its last chunk is
+    # transcribed, so the committed words are still utterance 0's
+    assert await service.get_audio_offset(room_id, 1) == 0
+    await service.process_audio(silence(1), room_id, False, utterance=1)
+    assert await service.get_audio_offset(room_id, 1) == 0
+
+    await service.process_audio(silence(4), room_id, True, utterance=0)
+    assert await service.get_audio_offset(room_id, 0) == 0
+    assert await service.get_audio_offset(room_id, 1) == 0
+
+    # Utterance 1 commits from its own words only
+    for seconds in (2, 3):
+        await service.process_audio(silence(seconds), room_id, False, utterance=1)
+    stabilizer = await service.stabilizers.get(room_id)
+    assert stabilizer.generation == 1
+    assert await service.get_audio_offset(room_id, 1) == stabilizer.offset > 0
+
+
+async def test_lost_final_chunk_does_not_stall_the_next_utterance(
+    service: RoomsService,
+):
+    room_id = await service.sse_manager.create_room()
+    await service.process_audio(silence(2), room_id, False, utterance=0)
+    await service.process_audio(silence(3), room_id, False, utterance=0)
+
+    # The final chunk of utterance 0 never arrived
+    await service.process_audio(silence(3), room_id, True, utterance=1)
+    for seconds in (2, 3):
+        await service.process_audio(silence(seconds), room_id, False, utterance=2)
+    assert await service.get_audio_offset(room_id, 2) > 0
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import random
+from collections.abc import AsyncIterator
+
+import fakeredis
+import pytest
+
+from app.services.broker import BaseBroker, InMemoryBroker, RedisBroker
+from app.services.rooms import SSEManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "redis"])
+async def broker(request: pytest.FixtureRequest) -> AsyncIterator[BaseBroker]:
+    if request.param == "memory":
+        broker: BaseBroker = InMemoryBroker()
+    else:
+        broker = RedisBroker(client=fakeredis.FakeAsyncRedis(decode_responses=True))
+    yield broker
+    await broker.close()
+
+
+async def test_values(broker: BaseBroker):
+    assert await broker.get_value("key") is None
+    await broker.set_value("key", "value")
+    assert await broker.get_value("key") == "value"
+
+    assert await broker.incr("counter") == 1
+    assert await broker.incr("counter") == 2
+    assert await broker.get_value("counter") == "2"
+
+
+async def test_sets(broker: BaseBroker):
+    assert await broker.sadd("set", "a")
+    assert not await broker.sadd("set", "a")
+    assert await broker.sadd("set", "b")
+    assert await broker.sismember("set", "a")
+    assert await broker.smembers("set") == {"a", "b"}
+    assert await broker.scard("set") == 2
+
+    assert await broker.srem("set", "a")
+    assert not await broker.srem("set", "a")
+    assert not await broker.sismember("set", "a")
+    assert await broker.srem("set", "b")
+    assert await broker.smembers("set") == set()
+    assert await broker.scard("set") == 0
+
+
+async def test_hash_reference_counts(broker: BaseBroker):
+    assert await broker.hincrby("counts", "es") == 1
+    assert await broker.hincrby("counts", "es") == 2
+    assert await broker.hincrby("counts", "de") == 1
+    assert await broker.hgetall("counts") == {"es": "2", "de": "1"}
+
+    assert await broker.hdecr("counts", "es") == 1
+    assert await broker.hgetall("counts") == {"es": "1", "de": "1"}
+    # A field is deleted as soon as its count reaches zero
+    assert await broker.hdecr("counts", "es") == 0
+    assert await broker.hgetall("counts") == {"de": "1"}
+    assert await broker.hdecr("counts", "de") == 0
+    assert await broker.hgetall("counts") == {}
+
+
+async def test_lists(broker: BaseBroker):
+    for value in "abcde":
+        await broker.rpush("list", value)
+    assert await broker.lrange("list", 0, -1) == list("abcde")
+    assert await broker.lrange("list", 1, 2) == ["b", "c"]
+
+    await broker.ltrim("list", -3, -1)
+    assert await broker.lrange("list", 0, -1) == ["c", "d", "e"]
+
+    assert await broker.lpop("list") == "c"
+    assert await broker.lpop("list") == "d"
+    assert await broker.lpop("list") == "e"
+    assert await broker.lpop("list") is None
+
+
+async def test_delete(broker: BaseBroker):
+    await broker.set_value("value", "1")
+    await broker.sadd("set", "a")
+    await broker.rpush("list", "a")
+    await broker.hincrby("hash", "a")
+
+    await broker.delete("value", "set", "list", "hash", "missing")
+
+    assert await broker.get_value("value") is None
+    assert await broker.smembers("set") == set()
+    assert await broker.lrange("list", 0, -1) == []
+    assert await broker.hgetall("hash") == {}
+
+
+async def test_publish_subscribe(broker: BaseBroker):
+    subscription = await broker.subscribe("channel")
+    messages = aiter(subscription)
+    await broker.publish("channel", "first")
+    await broker.publish("other", "ignored")
+    await broker.publish("channel", "second")
+
+    assert await asyncio.wait_for(anext(messages), 1) == "first"
+    assert await asyncio.wait_for(anext(messages), 1) == "second"
+    await subscription.close()
+
+
+async def test_publish_event(broker: BaseBroker):
+    subscription = await broker.subscribe("channel")
+    messages = aiter(subscription)
+    for text in "abc":
+        event = json.dumps({"text": text})
+        await broker.publish_event("id", "log", "channel", 2, event)
+
+    published = [await asyncio.wait_for(anext(messages), 1) for _ in range(3)]
+    assert [json.loads(event) for event in published] == [
+        {"id": 1, "text": "a"},
+        {"id": 2, "text": "b"},
+        {"id": 3, "text": "c"},
+    ]
+    assert await broker.lrange("log", 0, -1) == published[1:]
+    assert await broker.get_value("id") == "3"
+    await subscription.close()
+
+
+class SlowRedis(fakeredis.FakeAsyncRedis):
+    """Takes a varying time per command, as over a network."""
+
+    async def execute_command(self, *args, **options):
+        await asyncio.sleep(random.uniform(0, 0.002))
+        return await super().execute_command(*args, **options)
+
+
+def redis_workers(count: int) -> list[SSEManager]:
+    server = fakeredis.FakeServer()
+    return [
+        SSEManager(RedisBroker(client=SlowRedis(server=server, decode_responses=True)))
+        for _ in range(count)
+    ]
+
+
+async def test_workers_share_rooms_through_redis():
+    workers = redis_workers(2)
+    listening, publishing = workers
+
+    room_id = await publishing.create_room()
+    listener = await listening.subscribe_to_room(room_id, "client", "es")
+    assert await publishing.get_language_listener_counts(room_id) == {"es": 1}
+
+    await publishing.push_transcription_message(room_id, "Hello", True, 0)
+    await publishing.push_translation_message(room_id, 0, "Hola", True, "es", 0)
+    events = []
+    while len(events) < 2:
+        events.extend(await asyncio.wait_for(listener.next_events(), 1))
+    assert "Hello" in events[0].encoded
+    assert "Hola" in events[1].encoded
+
+    await listening.unsubscribe_from_room(room_id, "client")
+    assert await publishing.get_language_listener_counts(room_id) == {}
+    assert not await publishing.has_listeners(room_id)
+    for worker in workers:
+        await worker.broker.close()
+
+
+async def test_workers_publish_events_in_id_order():
+    workers = redis_workers(3)
+    listening = workers[0]
+    room_id = await listening.create_room()
+    listener = await listening.subscribe_to_room(room_id, "client", "es")
+
+    await asyncio.gather(
+        *(
+            worker.push_transcription_message(room_id, f"{n}", True, 0)
+            for n in range(10)
+            for worker in workers[1:]
+        )
+    )
+    events = []
+    while len(events) < 20:
+        events.extend(await asyncio.wait_for(listener.next_events(), 1))
+    assert [event.event_id for event in events] == list(range(1, 21))
+
+    history = await listening.broker.lrange(listening._history_key(room_id), 0, -1)
+    assert [json.loads(event)["id"] for event in history] == list(range(1, 21))
+    for worker in workers:
+        await worker.broker.close()
@@ -0,0 +1,31 @@
+import pytest
+
+from app.lib.fanout_benchmark import bench_encode, bench_fanout, bench_process_audio
+
+pytestmark = pytest.mark.anyio
+
+# Bounds are about ten times what a laptop measures, to catch an
+# accidental O(listeners) step in publishing rather than small slowdowns
+
+
+async def test_publish_cost_does_not_grow_with_subscribers():
+    few = await bench_fanout(subscribers=10, languages=5, events=10)
+    many = await bench_fanout(subscribers=1000, languages=5, events=10)
+
+    assert many["publish_us"] < 500
+    assert many["publish_us"] < 5 * few["publish_us"] + 50
+
+
+async def test_every_listener_reads_events_quickly():
+    result = await bench_fanout(subscribers=200, languages=5, events=10)
+
+    assert result["per_listener_ns"] < 100_000
+    assert result["bytes_per_subscriber"] < 10_000
+
+
+async def test_process_audio_overhead():
+    assert await bench_process_audio(languages=5, chunks=50) < 0.02
+
+
+def test_encode_cost():
+    assert bench_encode(10_000) < 50e-6
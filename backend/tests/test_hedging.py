@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from app.lib.hedging import MIN_SAMPLES, Hedger
+from app.services.fakes import FakeTranslationService
+from app.services.incremental_translation import (
+    IncrementalTranslator,
+    translate_incrementally,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def warm_hedger() -> Hedger:
+    hedger = Hedger(
+        "translation", percentile=95, min_delay_s=0.01, max_extra_load=1, window=50
+    )
+    hedger.latencies.extend([0.01] * MIN_SAMPLES)
+    return hedger
+
+
+async def test_slow_request_is_hedged_with_the_fallback():
+    primary_cancelled = asyncio.Event()
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+        return "primary"
+
+    async def fallback():
+        return "fallback"
+
+    hedger = warm_hedger()
+    assert await hedger.run(slow, fallback) == "fallback"
+    await asyncio.sleep(0)
+    assert primary_cancelled.is_set()
+    # The upstream's latency is recorded as at least the time waited
+    assert hedger.latencies[-1] >= 0.01
+
+
+async def test_failed_fallback_waits_for_the_primary():
+    async def primary():
+        await asyncio.sleep(0.05)
+        return "primary"
+
+    async def fallback():
+        raise ValueError("Unsupported language")
+
+    assert await warm_hedger().run(primary, fallback) == "primary"
+
+
+async def test_committed_translation_falls_back_when_upstream_is_slow():
+    translators = [IncrementalTranslator("de")]
+    translations = await translate_incrementally(
+        FakeTranslationService(latency_ms=5000, sigma=0, failure_rate=0),
+        translators,
+        "Hello there.",
+        True,
+        hedger=warm_hedger(),
+        fallback_service=FakeTranslationService(latency_ms=0, failure_rate=0),
+    )
+    assert translations == {"de": "[de] Hello there."}
@@ -0,0 +1,53 @@
+import pytest
+
+from app.lib.limiter import AdaptiveLimiter
+from app.lib.scheduler import FairScheduler
+from app.services.broker import InMemoryBroker
+from app.services.fakes import FakeTranscriptionService, FakeTranslationService
+from app.services.incremental_translation import IncrementalTranslators
+from app.services.rooms import BYTES_PER_SECOND, RoomsService, SSEManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def service() -> RoomsService:
+    scheduler = FairScheduler(quantum_s=1.0, max_in_flight=2, max_volatile=8)
+    limiter = AdaptiveLimiter(
+        initial_limit=4,
+        min_limit=1,
+        max_limit=8,
+        backoff=0.7,
+        latency_tolerance=2.0,
+        scheduler=scheduler,
+    )
+    return RoomsService(
+        FakeTranscriptionService(latency_ms=0, failure_rate=0),
+        FakeTranslationService(latency_ms=0, failure_rate=0),
+        SSEManager(InMemoryBroker(), scheduler),
+        IncrementalTranslators(16),
+        transcription_limiter=limiter,
+    )
+
+
+async def test_room_weight_is_scheduled_and_forgotten(service: RoomsService):
+    weighted = await service.sse_manager.create_room(weight=3.0)
+    default = await service.sse_manager.create_room()
+    audio = bytes(BYTES_PER_SECOND)
+    await service.process_audio(audio, weighted, True)
+    await service.process_audio(audio, default, True)
+
+    assert service.get_scheduling_stats(weighted)["weight"] == 3.0
+    assert service.get_scheduling_stats(default)["weight"] == 1.0
+    assert service.transcription_limiter.scheduler.weights == {weighted: 3.0}
+
+    assert await service.sse_manager.evict_room(weighted)
+    assert service.transcription_limiter.scheduler.weights == {}
+    assert service.get_scheduling_stats(weighted) is None
+
+    # Hand out freed ids right away, the recycled one starts over with the
+    # default weight
+    service.sse_manager.room_ids.id_space = 0
+    assert await service.sse_manager.create_room() == weighted
+    await service.process_audio(audio, weighted, True)
+    assert service.get_scheduling_stats(weighted)["weight"] == 1.0
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.services.broker import InMemoryBroker
+from app.services.fakes import FakeTranscriptionService, FakeTranslationService
+from app.services.incremental_translation import IncrementalTranslators
+from app.services.rooms import LoggedEvent, RoomListener, RoomsService, SSEManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def service() -> RoomsService:
+    return RoomsService(
+        FakeTranscriptionService(latency_ms=0, failure_rate=0),
+        FakeTranslationService(latency_ms=0, failure_rate=0),
+        SSEManager(InMemoryBroker()),
+        IncrementalTranslators(16),
+    )
+
+
+async def subscription_counts(service: RoomsService, room_id: str) -> dict[str, str]:
+    return await service.sse_manager.broker.hgetall(
+        service.sse_manager._subscriptions_key(room_id)
+    )
+
+
+async def test_closing_the_stream_unsubscribes(service: RoomsService):
+    room_id = await service.sse_manager.create_room()
+    stream = (await service.listen_to_room(room_id, ["es"]))()
+    # The retry hint, sent before waiting for events
+    await anext(stream)
+    assert await subscription_counts(service, room_id) == {
+        "transcription": "1",
+        "es": "1",
+    }
+
+    await stream.aclose()
+
+    assert await subscription_counts(service, room_id) == {}
+    assert not await service.sse_manager.has_listeners(room_id)
+    assert room_id not in service.sse_manager.rooms
+
+
+async def test_cancelling_the_stream_unsubscribes(service: RoomsService):
+    room_id = await service.sse_manager.create_room()
+    other = (await service.listen_to_room(room_id, ["es", "de"]))()
+    stream = (await service.listen_to_room(room_id, ["es"]))()
+    await anext(other)
+    await anext(stream)
+
+    # Waiting for events when the client goes away
+    task = asyncio.create_task(anext(stream))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert await subscription_counts(service, room_id) == {
+        "transcription": "1",
+        "es": "1",
+        "de": "1",
+    }
+    await other.aclose()
+    assert await subscription_counts(service, room_id) == {}
+
+
+async def test_events_only_wake_listeners_of_their_stream(
+    service: RoomsService, monkeypatch: pytest.MonkeyPatch
+):
+    polls = []
+    poll = RoomListener._poll
+
+    def counting_poll(listener: RoomListener) -> list[LoggedEvent]:
+        polls.append(listener)
+        return poll(listener)
+
+    monkeypatch.setattr(RoomListener, "_poll", counting_poll)
+
+    room_id = await service.sse_manager.create_room()
+    spanish = (await service.listen_to_room(room_id, ["es"]))()
+    german = (await service.listen_to_room(room_id, ["de"]))()
+    await anext(spanish)
+    await anext(german)
+    spanish_next = asyncio.create_task(anext(spanish))
+    german_next = asyncio.create_task(anext(german))
+    await asyncio.sleep(0)
+    polls.clear()
+
+    await service.sse_manager.push_translation_message(
+        room_id, 0, "Hallo", True, "de", received_ts=0
+    )
+    await asyncio.sleep(0.01)
+
+    assert "Hallo" in german_next.result()
+    # The Spanish listener was not even woken up to look
+    assert len(polls) == 1
+    assert not spanish_next.done()
+    spanish_next.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await spanish_next
+    await german.aclose()
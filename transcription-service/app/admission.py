@@ -0,0 +1,115 @@
+import math
+from collections import defaultdict
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+from app.metrics import QUEUED_AUDIO_SECONDS
+
+# Weight of the latest measurement in the transcription speed average
+SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised for work that would not be done before the deadline."""
+
+    def __init__(self, estimated_wait_s: float, retry_after_s: float):
+        super().__init__(
+            f"Overloaded, estimated wait {estimated_wait_s:.1f}s, "
+            f"retry after {retry_after_s:.0f}s"
+        )
+        self.estimated_wait_s = estimated_wait_s
+        self.retry_after_s = retry_after_s
+
+    def headers(self) -> dict[str, str]:
+        return {
+            "Retry-After": str(math.ceil(self.retry_after_s)),
+            "X-Estimated-Wait": f"{self.estimated_wait_s:.3f}",
+        }
+
+
+class AdmissionController:
+    """
+    Rejects work that would finish later than `deadline_s` from now.
+
+    Requests are counted by the seconds of audio they carry rather than one
+    each, since a 30 s clip keeps a worker busy for much longer than a 2 s
+    one. The time to get through the queued audio is estimated from the
+    measured transcription speed for each model tier, as the fast model gets
+    through audio much quicker. `workers` is either the number of workers
+    all tiers share, such as model replicas, or the number each tier has to
+    itself, such as one model per tier behind its own lock, in which case
+    only the audio queued for the same tier is waited for.
+    Failing right away lets the caller shed or retry the work and the
+    autoscaler see the overload, instead of requests timing out in a queue.
+    """
+
+    def __init__(self, deadline_s: float, workers: int | Mapping[str, int]):
+        self.deadline_s = deadline_s
+        self.workers = workers
+        self.queued_s: defaultdict[str, float] = defaultdict(float)
+        self.queued_count = 0
+        # Seconds of audio one worker transcribes per second with each
+        # tier, once measured
+        self.speeds: dict[str, float] = {}
+
+    def observe(self, audio_seconds: float, inference_time: float, tier: str):
+        if audio_seconds <= 0 or inference_time <= 0:
+            return
+        speed = audio_seconds / inference_time
+        if tier not in self.speeds:
+            self.speeds[tier] = speed
+        else:
+            self.speeds[tier] += SMOOTHING * (speed - self.speeds[tier])
+
+    def _speed(self, tier: str) -> float | None:
+        """Speed of a tier, or the slowest measured one until it has its own."""
+        if tier in self.speeds:
+            return self.speeds[tier]
+        return min(self.speeds.values(), default=None)
+
+    def estimated_wait(self, tier: str) -> float:
+        """Seconds until the audio queued now ahead of `tier` is transcribed."""
+        if isinstance(self.workers, Mapping):
+            tiers: list[str] = [tier]
+            workers = self.workers.get(tier, 1)
+        else:
+            tiers = list(self.queued_s)
+            workers = self.workers
+        total = 0.0
+        for queued_tier in tiers:
+            speed = self._speed(queued_tier)
+            if speed is not None:
+                total += self.queued_s[queued_tier] / speed
+        return total / workers
+
+    def check(self, audio_seconds: float, tier: str):
+        """Raise `Overloaded` if `audio_seconds` more would miss the deadline."""
+        speed = self._speed(tier)
+        # Nothing to compare against yet, and a lone request is always let
+        # in, however long its audio
+        if speed is None or self.queued_count == 0:
+            return
+        wait = self.estimated_wait(tier)
+        finish = wait + audio_seconds / speed
+        if finish > self.deadline_s:
+            raise Overloaded(wait, max(finish - self.deadline_s, 1.0))
+
+    @contextmanager
+    def queued(self, audio_seconds: float, tier: str):
+        """Count `audio_seconds` for `tier` as queued until the block exits."""
+        self.queued_s[tier] += audio_seconds
+        self.queued_count += 1
+        QUEUED_AUDIO_SECONDS.set(sum(self.queued_s.values()))
+        try:
+            yield
+        finally:
+            self.queued_s[tier] -= audio_seconds
+            self.queued_count -= 1
+            QUEUED_AUDIO_SECONDS.set(sum(self.queued_s.values()))
+
+    @contextmanager
+    def admit(self, audio_seconds: float, tier: str):
+        """Check and count `audio_seconds`, raising `Overloaded` if rejected."""
+        self.check(audio_seconds, tier)
+        with self.queued(audio_seconds, tier):
+            yield
@@ -0,0 +1,99 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Initial capacity of a buffer, 10 s of 16 kHz audio
+INITIAL_SAMPLES = 160_000
+# Buffers grown past this many samples are not returned to the pool
+MAX_POOLED_SAMPLES = 16_000 * 60
+
+
+def pcm16_to_float32(
+    pcm: NDArray[np.int16], out: NDArray[np.float32]
+) -> NDArray[np.float32]:
+    """Convert 16-bit PCM samples into the preallocated `out` array."""
+    np.copyto(out[: len(pcm)], pcm, casting="safe")
+    return out[: len(pcm)]
+
+
+class AudioBuffer:
+    """
+    Reusable storage for one request's audio.
+
+    The body is written straight into an int16 array and converted into a
+    float32 array of the same capacity, so neither is allocated per request.
+    """
+
+    __slots__ = ("pcm", "samples", "size")
+
+    def __init__(self, capacity: int = INITIAL_SAMPLES):
+        self.pcm = np.empty(capacity, dtype=np.int16)
+        self.samples = np.empty(capacity, dtype=np.float32)
+        # Bytes written so far
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.pcm)
+
+    def reserve(self, n_bytes: int):
+        """Make room for `n_bytes` of PCM, keeping what was written."""
+        needed = (n_bytes + 1) // 2
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        pcm = np.empty(capacity, dtype=np.int16)
+        pcm.view(np.uint8)[: self.size] = self.pcm.view(np.uint8)[: self.size]
+        self.pcm = pcm
+        self.samples = np.empty(capacity, dtype=np.float32)
+
+    def write(self, chunk: bytes):
+        end = self.size + len(chunk)
+        self.reserve(end)
+        self.pcm.view(np.uint8)[self.size : end] = np.frombuffer(chunk, np.uint8)
+        self.size = end
+
+    def to_pcm16(self) -> NDArray[np.int16]:
+        """The samples written so far, a view into the buffer."""
+        return self.pcm[: self.size // 2]
+
+    def to_float32(self) -> NDArray[np.float32]:
+        """The samples written so far as float32, a view into the buffer."""
+        return pcm16_to_float32(self.to_pcm16(), self.samples)
+
+
+class AudioBufferPool:
+    """Free list of `AudioBuffer`s, so steady traffic allocates nothing."""
+
+    def __init__(self, max_buffers: int):
+        self.max_buffers = max_buffers
+        self.free: deque[AudioBuffer] = deque()
+
+    @contextmanager
+    def buffer(self, n_bytes: int = 0):
+        """
+        Lend out a buffer with room for `n_bytes`. Arrays taken from it must
+        not be used after the block exits, unless it was cancelled.
+        """
+        buffer = self.free.pop() if self.free else AudioBuffer()
+        buffer.size = 0
+        buffer.reserve(n_bytes)
+        reusable = True
+        try:
+            yield buffer
+        except asyncio.CancelledError:
+            # Work started for the request can outlive it, like a shielded
+            # result cache computation other requests wait for, and still be
+            # reading the buffer. It is left to the garbage collector
+            reusable = False
+            raise
+        finally:
+            if (
+                reusable
+                and len(self.free) < self.max_buffers
+                and buffer.capacity <= MAX_POOLED_SAMPLES
+            ):
+                self.free.append(buffer)
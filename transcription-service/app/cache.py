@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.metrics import RESULT_CACHE_REQUESTS
+
+T = TypeVar("T")
+
+
+def audio_key(pcm: NDArray[np.int16], *options: Hashable) -> tuple:
+    """Key of a request: a hash of its samples and whatever changes the result."""
+    digest = hashlib.blake2b(pcm.data, digest_size=16).digest()
+    return (digest, *options)
+
+
+class ResultCache(Generic[T]):
+    """
+    LRU cache of transcription results with single-flight computation.
+
+    The same audio arrives more than once, e.g. the final post of an
+    utterance usually repeats the last partial and retries or hedged
+    requests resend identical bodies. Concurrent requests for a key that is
+    being computed wait for that computation instead of starting their own.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.results: OrderedDict[Hashable, T] = OrderedDict()
+        self.in_flight: dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        if key in self.results:
+            self.results.move_to_end(key)
+            RESULT_CACHE_REQUESTS.labels("hit").inc()
+            return self.results[key]
+
+        task = self.in_flight.get(key)
+        if task is not None:
+            RESULT_CACHE_REQUESTS.labels("coalesced").inc()
+        else:
+            RESULT_CACHE_REQUESTS.labels("miss").inc()
+            task = self.in_flight[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda task: self._store(key, task))
+        # Other requests may be waiting, so this one going away must not
+        # cancel the computation
+        return await asyncio.shield(task)
+
+    def _store(self, key: Hashable, task: asyncio.Task):
+        del self.in_flight[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.results[key] = task.result()
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
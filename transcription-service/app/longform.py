@@ -0,0 +1,109 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+import numpy as np
+from numpy.typing import NDArray
+
+T = TypeVar("T")
+
+SAMPLE_RATE = 16000
+# Energy is measured over frames of 30 ms
+FRAME_SAMPLES = SAMPLE_RATE * 30 // 1000
+# Frames converted to float32 at a time, about 2 minutes of audio
+ENERGY_BLOCK_FRAMES = 4096
+# Position of the speech threshold between the noise floor and speech level
+SPEECH_LEVEL = 0.2
+# Frames quieter than this RMS are never speech, whatever the noise floor
+MIN_SPEECH_RMS = 100.0
+
+
+def frame_energy(pcm: NDArray[np.int16]) -> NDArray[np.float32]:
+    """RMS of each frame, the last one padded with silence."""
+    n_frames = -(-len(pcm) // FRAME_SAMPLES)
+    energy = np.empty(n_frames, dtype=np.float32)
+    for i in range(0, n_frames, ENERGY_BLOCK_FRAMES):
+        block = pcm[i * FRAME_SAMPLES : (i + ENERGY_BLOCK_FRAMES) * FRAME_SAMPLES]
+        block = block.astype(np.float32)
+        block = np.pad(block, (0, -len(block) % FRAME_SAMPLES))
+        frames = block.reshape(-1, FRAME_SAMPLES)
+        energy[i : i + len(frames)] = np.sqrt(np.mean(np.square(frames), axis=1))
+    return energy
+
+
+def split_at_pauses(
+    pcm: NDArray[np.int16], max_segment_s: float = 30.0, min_pause_s: float = 0.3
+) -> list[tuple[int, int]]:
+    """
+    Split a recording into segments of at most `max_segment_s`, returned as
+    `(start, end)` sample ranges.
+
+    Frames a fifth of the way from the noise floor to the speech level,
+    taken as the 10th and 90th percentiles of the frame energies, are
+    speech. A segment is cut in the middle of
+    the last pause of at least `min_pause_s` that fits, or at its quietest
+    frame if there is none, so words are not split. Silence between
+    segments is skipped.
+    """
+    energy = frame_energy(pcm)
+    if len(energy) == 0:
+        return []
+    floor, loud = np.percentile(energy, [10, 90])
+    threshold = max(float(floor + (loud - floor) * SPEECH_LEVEL), MIN_SPEECH_RMS)
+    speech = energy > threshold
+    max_frames = max(int(max_segment_s * SAMPLE_RATE) // FRAME_SAMPLES, 2)
+    min_pause_frames = max(int(min_pause_s * SAMPLE_RATE) // FRAME_SAMPLES, 1)
+
+    segments = []
+    position = 0
+    while True:
+        voiced = np.flatnonzero(speech[position:])
+        if len(voiced) == 0:
+            break
+        start = position + int(voiced[0])
+        limit = start + max_frames
+        if limit >= len(speech):
+            end = len(speech)
+        else:
+            window = speech[start:limit]
+            # Runs of silence as [run_starts[i], run_ends[i]) in the window
+            edges = np.flatnonzero(np.diff(window.astype(np.int8), prepend=1, append=1))
+            run_starts, run_ends = edges[::2], edges[1::2]
+            pauses = np.flatnonzero(run_ends - run_starts >= min_pause_frames)
+            if len(pauses) > 0:
+                last = pauses[-1]
+                end = start + int(run_starts[last] + run_ends[last]) // 2
+            else:
+                half = max_frames // 2
+                end = start + half + int(np.argmin(energy[start + half : limit]))
+        segments.append((start * FRAME_SAMPLES, min(end * FRAME_SAMPLES, len(pcm))))
+        position = end
+    return segments
+
+
+async def map_ordered(
+    items: list[T],
+    run: Callable[[T], Awaitable],
+    parallelism: int,
+) -> AsyncIterator:
+    """
+    Run `run` on up to `parallelism` items at a time, yielding the results
+    in the order of the items as soon as each is available.
+    """
+    pending: deque[asyncio.Future] = deque()
+    remaining = iter(items)
+    try:
+        for item in remaining:
+            pending.append(asyncio.ensure_future(run(item)))
+            if len(pending) >= parallelism:
+                break
+        while pending:
+            result = await pending.popleft()
+            for item in remaining:
+                pending.append(asyncio.ensure_future(run(item)))
+                break
+            yield result
+    finally:
+        # The client went away or a batch failed
+        for task in pending:
+            task.cancel()
@@ -1,12 +1,35 @@
+import asyncio
+import json
 import logging
 import os
 import sys
-from contextlib import asynccontextmanager
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+from functools import partial
 from typing import Annotated
 
 import numpy as np
-from fastapi import FastAPI, Response, Body
+from fastapi import FastAPI, Request, Response, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from numpy.typing import NDArray
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from app.admission import AdmissionController, Overloaded
+from app.buffers import AudioBuffer, AudioBufferPool, pcm16_to_float32
+from app.cache import ResultCache, audio_key
+from app.longform import map_ordered, split_at_pauses
+from app.metrics import (
+    AUDIO_SECONDS,
+    IN_FLIGHT,
+    INFERENCE_LATENCY,
+    REAL_TIME_FACTOR,
+    REQUEST_LATENCY,
+    REQUESTS,
+)
+from app.replicas import ReplicaPool
+from app.transcripts import Tier, Transcript, Word
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,37 +38,98 @@ logger = logging.getLogger(__name__)
 # Silence chatty logs from nemo
 logging.getLogger("nemo_logger").setLevel(logging.CRITICAL)
 
-# Global model variable
+SAMPLE_RATE = 16000
+MODEL_NAME = "nvidia/parakeet-tdt-0.6b-v2"
+# Smaller model for volatile partials, which are replaced within a second
+# anyway, e.g. nvidia/parakeet-tdt_ctc-110m. Only loaded when set, pair it
+# with ASR_FAST_VOLATILE=true on the backend
+FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", "")
+
+
+# Global model variables
 model = None
+fast_model = None
+# Inference in this process runs in threads, one call at a time per model
+model_locks: dict[Tier, threading.Lock] = {
+    "accurate": threading.Lock(),
+    "fast": threading.Lock(),
+}
+
+# Model replicas in forked worker processes, 0 runs the model in this process
+REPLICAS = int(os.getenv("TRANSCRIPTION_REPLICAS", "0"))
+THREADS_PER_REPLICA = int(os.getenv("TRANSCRIPTION_THREADS_PER_REPLICA", "1"))
+replica_pool: ReplicaPool | None = None
+
+# Request bodies are read into pooled buffers instead of fresh bytes objects
+audio_buffers = AudioBufferPool(max_buffers=8)
+
+# Results of recently transcribed audio, 0 disables the cache
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+result_cache: ResultCache[Transcript] | None = (
+    ResultCache(RESULT_CACHE_SIZE) if RESULT_CACHE_SIZE > 0 else None
+)
+
+# Requests that would be done later than this many seconds from now are
+# rejected with a 429, 0 disables admission control. Replicas are shared by
+# all tiers, while in this process each tier runs one call at a time
+ADMISSION_DEADLINE_S = float(os.getenv("ADMISSION_DEADLINE_S", "10"))
+admission: AdmissionController | None = (
+    AdmissionController(
+        ADMISSION_DEADLINE_S,
+        workers=REPLICAS if REPLICAS > 0 else {tier: 1 for tier in model_locks},
+    )
+    if ADMISSION_DEADLINE_S > 0
+    else None
+)
 
 
 class NoStdStreams:
-    """Context manager to suppress stdout/stderr during model inference."""
+    """
+    Context manager to suppress stdout/stderr during model inference.
+
+    The streams are process-wide and both models can run at once in two
+    threads, so the first one in swaps them out and the last one out
+    restores them.
+    """
 
-    def __init__(self):
-        self.devnull = open(os.devnull, "w")
+    lock = threading.Lock()
+    depth = 0
+    saved: tuple = ()
+    devnull = None
 
     def __enter__(self):
-        self._stdout, self._stderr = sys.stdout, sys.stderr
-        self._stdout.flush(), self._stderr.flush()
-        sys.stdout, sys.stderr = self.devnull, self.devnull
+        cls = NoStdStreams
+        with cls.lock:
+            if cls.depth == 0:
+                sys.stdout.flush(), sys.stderr.flush()
+                cls.saved = (sys.stdout, sys.stderr)
+                cls.devnull = open(os.devnull, "w")
+                sys.stdout, sys.stderr = cls.devnull, cls.devnull
+            cls.depth += 1
 
     def __exit__(self, exc_type, exc_value, traceback):
-        sys.stdout, sys.stderr = self._stdout, self._stderr
-        self.devnull.close()
+        cls = NoStdStreams
+        with cls.lock:
+            cls.depth -= 1
+            if cls.depth == 0:
+                sys.stdout, sys.stderr = cls.saved
+                cls.devnull.close()
 
 
 def load_model():
-    """Load the NeMo ASR model."""
-    global model
+    """Load the NeMo ASR model, and the fast one if configured."""
+    global model, fast_model
 
     try:
         import nemo.collections.asr as nemo_asr
 
         logger.info("Loading NeMo ASR model...")
-        model = nemo_asr.models.ASRModel.from_pretrained(
-            model_name="nvidia/parakeet-tdt-0.6b-v2"
-        )
+        model = nemo_asr.models.ASRModel.from_pretrained(model_name=MODEL_NAME)
+        if FAST_MODEL_NAME:
+            logger.info(f"Loading fast model {FAST_MODEL_NAME}...")
+            fast_model = nemo_asr.models.ASRModel.from_pretrained(
+                model_name=FAST_MODEL_NAME
+            )
         logger.info("Model loaded successfully!")
 
     except ImportError as e:
@@ -59,24 +143,106 @@ def load_model():
         raise
 
 
-def transcribe_audio(audio_bytes: bytes) -> str:
-    """Transcribe audio bytes to text."""
-    global model
+def to_transcript(hypothesis, timestamps: bool) -> Transcript:
+    if not timestamps:
+        return {"text": hypothesis.text}
+
+    words = [
+        Word(word=word["word"], start=word["start"], end=word["end"])
+        for word in hypothesis.timestamp["word"]
+    ]
+    # Only set when the decoder was configured to compute confidence
+    confidence = getattr(hypothesis, "word_confidence", None)
+    if confidence is not None and len(confidence) == len(words):
+        for word, score in zip(words, confidence):
+            word["confidence"] = float(score)
+    return {"text": hypothesis.text, "words": words}
 
-    if model is None:
+
+def resolve_tier(tier: Tier) -> Tier:
+    """The tier that will serve a request asking for `tier`."""
+    return "fast" if tier == "fast" and fast_model is not None else "accurate"
+
+
+def model_name(tier: Tier) -> str:
+    return FAST_MODEL_NAME if tier == "fast" else MODEL_NAME
+
+
+def run_model_batch(
+    audios: list[NDArray[np.float32]],
+    timestamps: bool = False,
+    tier: Tier = "accurate",
+) -> list[Transcript]:
+    """
+    Transcribe clips of 16 kHz float32 samples in one batch, in this process
+    or a replica, with the model of `tier`. With `timestamps`, the words are
+    returned with their timings as well.
+    """
+    global model, fast_model
+
+    selected = fast_model if tier == "fast" else model
+    if selected is None:
         raise RuntimeError(
             "Model not loaded. Please ensure the model is loaded before transcription."
         )
 
-    try:
-        # Convert audio bytes to numpy array
-        audio_data = np.frombuffer(audio_bytes, dtype=np.int16).astype(np.float32)
+    # Transcribe with suppressed output
+    with NoStdStreams():
+        output = selected.transcribe(
+            audios, batch_size=len(audios), timestamps=timestamps
+        )
+    return [to_transcript(hypothesis, timestamps) for hypothesis in output]
 
-        # Transcribe with suppressed output
-        with NoStdStreams():
-            output = model.transcribe([audio_data])
 
-        return output[0].text
+def run_model(
+    audio_data: NDArray[np.float32], timestamps: bool = False, tier: Tier = "accurate"
+) -> Transcript:
+    return run_model_batch([audio_data], timestamps, tier)[0]
+
+
+def run_in_process(
+    audios: list[NDArray[np.float32]], timestamps: bool = False, tier: Tier = "accurate"
+) -> tuple[list[Transcript], float]:
+    """
+    Run a model in this process, returning the transcripts and inference
+    time. Called from worker threads so the event loop keeps serving.
+    """
+    with model_locks[tier]:
+        start = time.perf_counter()
+        transcripts = run_model_batch(audios, timestamps, tier)
+        return transcripts, time.perf_counter() - start
+
+
+def observe_inference(
+    audio_seconds: float, inference_time: float, tier: Tier = "accurate"
+):
+    INFERENCE_LATENCY.labels(tier).observe(inference_time)
+    AUDIO_SECONDS.labels(tier).inc(audio_seconds)
+    if audio_seconds > 0:
+        REAL_TIME_FACTOR.labels(tier).observe(inference_time / audio_seconds)
+    if admission is not None:
+        admission.observe(audio_seconds, inference_time, tier)
+
+
+def transcribe_audio(
+    audio_data: NDArray[np.float32],
+    timings: dict[str, float] | None = None,
+    timestamps: bool = False,
+    tier: Tier = "accurate",
+) -> Transcript:
+    """
+    Transcribe 16 kHz float32 samples to text with the model of `tier`.
+
+    If `timings` is given, the duration in seconds of each stage is recorded
+    in it for the `Server-Timing` response header.
+    """
+    try:
+        [transcript], inference_time = run_in_process([audio_data], timestamps, tier)
+
+        if timings is not None:
+            timings["inference"] = inference_time
+        observe_inference(len(audio_data) / SAMPLE_RATE, inference_time, tier)
+        return transcript
 
     except Exception as e:
         logger.error(f"Transcription failed: {e}")
@@ -86,14 +252,19 @@ def transcribe_audio(audio_bytes: bytes) -> str:
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan event handler for model loading."""
-    global model
+    global model, replica_pool
 
     logger.info("Starting transcription service...")
 
     load_model()
+    if REPLICAS > 0:
+        replica_pool = ReplicaPool(run_model_batch, REPLICAS, THREADS_PER_REPLICA)
+        replica_pool.start()
     yield
 
     logger.info("Shutting down transcription service...")
+    if replica_pool is not None:
+        replica_pool.close()
 
 
 # Create FastAPI app with lifespan
@@ -121,17 +292,201 @@ async def status():
     return Response(status_code=200, content="OK")
 
 
+def format_server_timing(timings: dict[str, float]) -> str:
+    """Format stage durations in seconds as a `Server-Timing` header."""
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()
+    )
+
+
+def reject(error: Overloaded) -> JSONResponse:
+    """429 telling the caller when to retry and how long the queue is."""
+    REQUESTS.labels("rejected").inc()
+    return JSONResponse(
+        {"error": str(error), "success": False},
+        status_code=429,
+        headers=error.headers(),
+    )
+
+
+async def run_transcription(
+    buffer: AudioBuffer, timings: dict[str, float], timestamps: bool, tier: Tier
+) -> Transcript:
+    """
+    Transcribe a request's audio on a replica or in this process. Raises
+    `Overloaded` if it would not be done in time.
+    """
+    pcm = buffer.to_pcm16()
+    with admission.admit(len(pcm) / SAMPLE_RATE, tier) if admission else nullcontext():
+        if replica_pool is not None:
+            transcript, replica_timings = await replica_pool.transcribe(
+                pcm, timestamps, tier
+            )
+            timings.update(replica_timings)
+            observe_inference(len(pcm) / SAMPLE_RATE, timings["inference"], tier)
+            return transcript
+
+        start = time.perf_counter()
+        audio_data = buffer.to_float32()
+        timings["decode"] = time.perf_counter() - start
+        return await asyncio.to_thread(
+            transcribe_audio, audio_data, timings, timestamps, tier
+        )
+
+
 @app.post("/transcribe")
 async def transcribe(
-    raw_data: Annotated[bytes, Body(media_type="application/octet-stream")],
+    request: Request,
+    response: Response,
+    traceparent: Annotated[str | None, Header()] = None,
+    timestamps: bool = False,
+    tier: Tier = "accurate",
 ):
-    """Transcribe audio data."""
-    try:
-        text = transcribe_audio(raw_data)
-        return {"text": text, "success": True}
-    except Exception as e:
-        logger.error(f"Transcription error: {e}")
-        return {"error": str(e), "success": False}, 500
+    """
+    Transcribe audio data.
+
+    The body is 16-bit PCM, streamed into a pooled buffer and converted to
+    float32 in place. With `timestamps`, the response also lists the words
+    with their start and end in seconds, and their confidence if the model
+    computes it. With `tier=fast`, the smaller fast model is used if there
+    is one, for volatile partials that are soon replaced. Results are
+    cached by a hash of the audio. Requests that
+    would not be done within the admission deadline are rejected with a 429
+    and a `Retry-After` header. The duration of each stage is returned in a
+    `Server-Timing` header so the caller can attach it to its own trace.
+    """
+    timings: dict[str, float] = {}
+    content_length = int(request.headers.get("content-length", 0))
+    with (
+        IN_FLIGHT.track_inprogress(),
+        REQUEST_LATENCY.time(),
+        audio_buffers.buffer(content_length) as buffer,
+    ):
+        try:
+            async for chunk in request.stream():
+                buffer.write(chunk)
+
+            tier = resolve_tier(tier)
+            compute = partial(run_transcription, buffer, timings, timestamps, tier)
+            if result_cache is None:
+                transcript = await compute()
+            else:
+                start = time.perf_counter()
+                key = audio_key(buffer.to_pcm16(), model_name(tier), timestamps)
+                transcript = await result_cache.get(key, compute)
+                # Served from the cache or by an identical request
+                if not timings:
+                    timings["cache"] = time.perf_counter() - start
+            response.headers["Server-Timing"] = format_server_timing(timings)
+            if traceparent is not None:
+                logger.debug(f"Trace {traceparent}: {timings}")
+            REQUESTS.labels("success").inc()
+            return {**transcript, "success": True}
+        except Overloaded as e:
+            return reject(e)
+        except Exception as e:
+            logger.error(f"Transcription error: {e}")
+            REQUESTS.labels("error").inc()
+            # A real 500 so callers see the failure in the status
+            return JSONResponse({"error": str(e), "success": False}, status_code=500)
+
+
+async def transcribe_segments(
+    pcms: list[NDArray[np.int16]], timestamps: bool
+) -> list[Transcript]:
+    """Transcribe one batch of long-form segments on a replica or in this process."""
+    audio_seconds = sum(len(pcm) for pcm in pcms) / SAMPLE_RATE
+    # Counted so live requests see the load, but never rejected once started
+    with admission.queued(audio_seconds, "accurate") if admission else nullcontext():
+        if replica_pool is not None:
+            transcripts, timings = await replica_pool.transcribe_batch(pcms, timestamps)
+            inference_time = timings["inference"]
+        else:
+            audios = [
+                pcm16_to_float32(pcm, np.empty(len(pcm), dtype=np.float32))
+                for pcm in pcms
+            ]
+            transcripts, inference_time = await asyncio.to_thread(
+                run_in_process, audios, timestamps
+            )
+    observe_inference(audio_seconds, inference_time)
+    return transcripts
+
+
+@app.post("/transcribe/long")
+async def transcribe_long(
+    request: Request,
+    timestamps: bool = False,
+    batch_size: Annotated[int, Query(ge=1, le=64)] = 8,
+    max_segment_s: Annotated[float, Query(gt=1, le=60)] = 30.0,
+):
+    """
+    Transcribe a full recording, such as an event, as newline-delimited JSON.
+
+    The body is 16-bit PCM. It is split at pauses into segments of at most
+    `max_segment_s` seconds, which are decoded `batch_size` at a time, a
+    batch per replica in parallel. Each segment is streamed back in order as
+    soon as it is done, with its `start` and `end` in seconds and, with
+    `timestamps`, its words timed from the start of the recording. The last
+    line reports the number of segments, or the error that stopped the job.
+    A job is rejected with a 429 up front if live requests already wait
+    longer than the admission deadline.
+    """
+    if admission is not None:
+        try:
+            admission.check(0.0, "accurate")
+        except Overloaded as e:
+            return reject(e)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+    pcm = np.frombuffer(body, dtype=np.int16, count=len(body) // 2)
+    segments = split_at_pauses(pcm, max_segment_s)
+    batches = [
+        segments[i : i + batch_size] for i in range(0, len(segments), batch_size)
+    ]
+
+    async def run(batch: list[tuple[int, int]]) -> list[Transcript]:
+        return await transcribe_segments(
+            [pcm[start:end] for start, end in batch], timestamps
+        )
+
+    async def lines():
+        index = 0
+        with IN_FLIGHT.track_inprogress():
+            try:
+                # In this process batches run one after the other anyway
+                parallelism = len(replica_pool.replicas) if replica_pool else 1
+                async for transcripts in map_ordered(batches, run, parallelism):
+                    for transcript in transcripts:
+                        start, end = segments[index]
+                        offset = start / SAMPLE_RATE
+                        line = {
+                            "segment": index,
+                            "start": offset,
+                            "end": end / SAMPLE_RATE,
+                            **transcript,
+                        }
+                        if "words" in transcript:
+                            line["words"] = [
+                                {
+                                    **word,
+                                    "start": word["start"] + offset,
+                                    "end": word["end"] + offset,
+                                }
+                                for word in transcript["words"]
+                            ]
+                        yield json.dumps(line) + "\n"
+                        index += 1
+                REQUESTS.labels("success").inc()
+                yield json.dumps({"done": True, "segments": index}) + "\n"
+            except Exception as e:
+                logger.error(f"Long-form transcription error: {e}")
+                REQUESTS.labels("error").inc()
+                yield json.dumps({"done": True, "error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @app.get("/health")
@@ -141,3 +496,9 @@ async def health():
         "status": "healthy",
         "service": "transcription-service",
     }
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,60 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "transcription_request_latency_seconds",
+    "Time spent handling a /transcribe request",
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUESTS = Counter(
+    "transcription_requests_total",
+    "Transcription requests by outcome",
+    ["outcome"],
+)
+
+IN_FLIGHT = Gauge(
+    "transcription_in_flight_requests",
+    "Transcription requests currently being handled",
+)
+
+# Inference by model tier, "accurate" or "fast"
+INFERENCE_LATENCY = Histogram(
+    "transcription_inference_seconds",
+    "Time spent in model inference",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REAL_TIME_FACTOR = Histogram(
+    "transcription_real_time_factor",
+    "Inference time divided by audio duration",
+    ["model"],
+    buckets=(0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0),
+)
+
+AUDIO_SECONDS = Counter(
+    "transcription_audio_seconds_total",
+    "Seconds of audio transcribed",
+    ["model"],
+)
+
+REPLICA_IN_FLIGHT = Gauge(
+    "transcription_replica_in_flight_requests",
+    "Requests assigned to each model replica, running or waiting",
+    ["replica"],
+)
+
+# Results served from the cache ("hit"), by waiting for an identical request
+# ("coalesced") or computed ("miss")
+RESULT_CACHE_REQUESTS = Counter(
+    "transcription_result_cache_requests_total",
+    "Transcription result cache lookups by outcome",
+    ["outcome"],
+)
+
+QUEUED_AUDIO_SECONDS = Gauge(
+    "transcription_queued_audio_seconds",
+    "Seconds of audio admitted and not yet transcribed",
+)
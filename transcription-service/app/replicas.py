@@ -0,0 +1,224 @@
+import asyncio
+import gc
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable
+
+import numpy as np
+from numpy.typing import NDArray
+
+from app.buffers import MAX_POOLED_SAMPLES, pcm16_to_float32
+from app.metrics import REPLICA_IN_FLIGHT
+from app.transcripts import Tier, Transcript
+
+logger = logging.getLogger(__name__)
+
+
+def _serve(
+    run: Callable[[list[NDArray[np.float32]], bool, Tier], list[Transcript]],
+    conn: Connection,
+    shm: SharedMemory,
+    cores: list[int],
+    threads: int,
+):
+    """Worker loop: transcribe the batches the parent put in shared memory."""
+    if cores:
+        os.sched_setaffinity(0, cores)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    samples = np.ndarray((shm.size // 4,), dtype=np.float32, buffer=shm.buf)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        batch, timestamps, tier = message
+        if isinstance(batch[0], int):
+            # Lengths of the segments, laid out one after the other
+            ends = np.cumsum(batch)
+            audios = [samples[end - length : end] for length, end in zip(batch, ends)]
+        else:
+            # Audio too long for shared memory is sent through the pipe as PCM
+            audios = [
+                pcm16_to_float32(pcm, np.empty(len(pcm), dtype=np.float32))
+                for pcm in batch
+            ]
+        start = time.perf_counter()
+        try:
+            transcripts = run(audios, timestamps, tier)
+            conn.send((transcripts, time.perf_counter() - start, None))
+        except Exception as e:
+            conn.send((None, 0.0, str(e)))
+    del samples
+    shm.close()
+
+
+class Replica:
+    """One worker process, taking one request at a time over its pipe."""
+
+    def __init__(
+        self,
+        index: int,
+        run: Callable[[list[NDArray[np.float32]], bool, Tier], list[Transcript]],
+        cores: list[int],
+        threads: int,
+        capacity: int,
+    ):
+        self.index = index
+        self.cores = cores
+        self.shm = SharedMemory(create=True, size=capacity * 4)
+        self.samples = np.ndarray((capacity,), dtype=np.float32, buffer=self.shm.buf)
+        self.conn, child_conn = multiprocessing.Pipe()
+        # Forked, so the worker shares the parent's weight pages copy-on-write
+        self.process = multiprocessing.get_context("fork").Process(
+            target=_serve,
+            args=(run, child_conn, self.shm, cores, threads),
+            name=f"replica-{index}",
+            daemon=True,
+        )
+        self.lock = asyncio.Lock()
+        self.load = 0
+
+    async def transcribe_batch(
+        self, pcms: list[NDArray[np.int16]], timestamps: bool, tier: Tier
+    ) -> tuple[list[Transcript], dict[str, float]]:
+        # Counted right away so concurrent dispatches see each other
+        self.load += 1
+        REPLICA_IN_FLIGHT.labels(str(self.index)).inc()
+        if self.load > 1:
+            # The caller's buffer may be reused before our turn comes
+            pcms = [pcm.copy() for pcm in pcms]
+        # Once sent, the worker's answer has to be read even if the caller
+        # goes away, or the next request would get it
+        return await asyncio.shield(self._call(pcms, timestamps, tier))
+
+    async def _call(
+        self, pcms: list[NDArray[np.int16]], timestamps: bool, tier: Tier
+    ) -> tuple[list[Transcript], dict[str, float]]:
+        try:
+            async with self.lock:
+                return await self._send(pcms, timestamps, tier)
+        finally:
+            self.load -= 1
+            REPLICA_IN_FLIGHT.labels(str(self.index)).dec()
+
+    async def _send(
+        self, pcms: list[NDArray[np.int16]], timestamps: bool, tier: Tier
+    ) -> tuple[list[Transcript], dict[str, float]]:
+        start = time.perf_counter()
+        message: tuple[list[int] | list[NDArray[np.int16]], bool, Tier]
+        if sum(len(pcm) for pcm in pcms) <= len(self.samples):
+            offset = 0
+            for pcm in pcms:
+                pcm16_to_float32(pcm, self.samples[offset:])
+                offset += len(pcm)
+            lengths = [len(pcm) for pcm in pcms]
+            message = (lengths, timestamps, tier)
+        else:
+            message = (pcms, timestamps, tier)
+        timings = {"decode": time.perf_counter() - start}
+
+        self.conn.send(message)
+        transcripts, inference_time, error = await asyncio.to_thread(self.conn.recv)
+        if error is not None:
+            raise RuntimeError(f"Replica {self.index} failed: {error}")
+        timings["inference"] = inference_time
+        return transcripts, timings
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send(None)
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+        del self.samples
+        self.shm.close()
+        self.shm.unlink()
+
+
+class ReplicaPool:
+    """
+    Model replicas in forked worker processes, each pinned to its own cores.
+
+    The model is loaded once in the parent and the workers are forked from
+    it, so the weights are shared copy-on-write instead of being loaded N
+    times. Each worker runs inference with `threads` intra-op threads on as
+    many dedicated cores, avoiding the oversubscription of one process
+    using every core, and requests go to the least loaded replica.
+
+    The pool must be started before the parent runs any inference, forking
+    a process whose OpenMP threads are already running can deadlock.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[list[NDArray[np.float32]], bool, Tier], list[Transcript]],
+        replicas: int,
+        threads: int,
+        capacity: int = MAX_POOLED_SAMPLES,
+    ):
+        self.run = run
+        self.size = replicas
+        self.threads = threads
+        self.capacity = capacity
+        self.replicas: list[Replica] = []
+
+    def start(self):
+        cores = sorted(os.sched_getaffinity(0))
+        if self.size * self.threads > len(cores):
+            logger.warning(
+                f"{self.size} replicas x {self.threads} threads oversubscribe "
+                f"{len(cores)} cores"
+            )
+        self.replicas = [
+            Replica(
+                i,
+                self.run,
+                # Replicas share cores round robin when there are too few
+                [
+                    cores[(i * self.threads + j) % len(cores)]
+                    for j in range(self.threads)
+                ],
+                self.threads,
+                self.capacity,
+            )
+            for i in range(self.size)
+        ]
+        # Keep the collector from touching, and so copying, the shared pages
+        gc.freeze()
+        for replica in self.replicas:
+            replica.process.start()
+        logger.info(f"Started {self.size} replicas with {self.threads} threads each")
+
+    def close(self):
+        for replica in self.replicas:
+            replica.close()
+        self.replicas = []
+
+    async def transcribe_batch(
+        self,
+        pcms: list[NDArray[np.int16]],
+        timestamps: bool = False,
+        tier: Tier = "accurate",
+    ) -> tuple[list[Transcript], dict[str, float]]:
+        """
+        Transcribe segments of 16-bit PCM in one batch with the model of
+        `tier`, returning their transcripts and the stage durations.
+        """
+        replica = min(self.replicas, key=lambda replica: replica.load)
+        return await replica.transcribe_batch(pcms, timestamps, tier)
+
+    async def transcribe(
+        self, pcm: NDArray[np.int16], timestamps: bool = False, tier: Tier = "accurate"
+    ) -> tuple[Transcript, dict[str, float]]:
+        """Transcribe 16-bit PCM, returning the transcript and stage durations."""
+        transcripts, timings = await self.transcribe_batch([pcm], timestamps, tier)
+        return transcripts[0], timings
@@ -0,0 +1,18 @@
+from typing import Literal, NotRequired, TypedDict
+
+# Which model a request asks for, "fast" falls back to the main model when
+# there is no fast one
+Tier = Literal["accurate", "fast"]
+
+
+class Word(TypedDict):
+    word: str
+    # Seconds from the start of the audio
+    start: float
+    end: float
+    confidence: NotRequired[float]
+
+
+class Transcript(TypedDict):
+    text: str
+    words: NotRequired[list[Word]]
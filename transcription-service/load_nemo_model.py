@@ -5,6 +5,7 @@ This script can be used to test model loading and verify the environment setup.
 """
 
 import logging
+import os
 import sys
 import time
 from pathlib import Path
@@ -91,6 +92,13 @@ def main():
     # Load the model
     model = load_nemo_model()
 
+    # Cache the fast model for volatile partials as well
+    fast_model_name = os.getenv("FAST_MODEL_NAME", "nvidia/parakeet-tdt_ctc-110m")
+    if model is not None and fast_model_name:
+        if load_nemo_model(fast_model_name) is None:
+            logger.error("Fast model loading failed!")
+            sys.exit(1)
+
     if model is not None:
         logger.info("Model loading completed successfully!")
         logger.info("You can now use this model for speech recognition tasks.")
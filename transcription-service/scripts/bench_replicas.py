@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Find the best split of CPU cores into model replicas and threads.
+
+Loads the model once, then for each `replicas x threads` split starts a
+`ReplicaPool`, keeps `--concurrency` requests in flight until `--requests`
+have completed and reports throughput in seconds of audio per second along
+with latency percentiles. Run it on the instance type you deploy to and set
+TRANSCRIPTION_REPLICAS and TRANSCRIPTION_THREADS_PER_REPLICA to the winner:
+
+    uv run scripts/bench_replicas.py --wav speech.wav --splits 1x8 2x4 4x2 8x1
+
+Without `--splits`, every split that uses all the available cores is tried.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.main import SAMPLE_RATE, load_model, run_model_batch  # noqa: E402
+from app.replicas import ReplicaPool  # noqa: E402
+
+
+def load_audio(path: str | None, seconds: float) -> np.ndarray:
+    """16-bit PCM from a 16 kHz mono WAV file, or noise if none is given."""
+    if path is None:
+        rng = np.random.default_rng(0)
+        return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 3000).astype(np.int16)
+    with wave.open(path) as f:
+        if f.getframerate() != SAMPLE_RATE or f.getnchannels() != 1:
+            raise SystemExit(f"{path} must be 16 kHz mono")
+        pcm = np.frombuffer(f.readframes(f.getnframes()), dtype=np.int16)
+    return pcm[: int(seconds * SAMPLE_RATE)]
+
+
+def default_splits() -> list[tuple[int, int]]:
+    cores = len(os.sched_getaffinity(0))
+    return [
+        (cores // threads, threads)
+        for threads in range(1, cores + 1)
+        if cores % threads == 0
+    ]
+
+
+async def bench_split(
+    replicas: int, threads: int, pcm: np.ndarray, requests: int, concurrency: int
+) -> dict[str, float]:
+    pool = ReplicaPool(run_model_batch, replicas, threads)
+    pool.start()
+    try:
+        # One warm-up request per replica
+        await asyncio.gather(*(pool.transcribe(pcm) for _ in range(replicas)))
+
+        latencies = []
+        remaining = requests
+
+        async def client():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                await pool.transcribe(pcm)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    latencies.sort()
+    audio_seconds = len(pcm) / SAMPLE_RATE * requests
+    return {
+        "throughput": audio_seconds / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args):
+    splits = (
+        [tuple(int(n) for n in split.split("x")) for split in args.splits]
+        if args.splits
+        else default_splits()
+    )
+    pcm = load_audio(args.wav, args.seconds)
+    load_model()
+
+    print(f"{'split':>8} {'audio s/s':>10} {'p50 ms':>9} {'p95 ms':>9}")
+    for replicas, threads in splits:
+        result = await bench_split(
+            replicas, threads, pcm, args.requests, args.concurrency or replicas * 2
+        )
+        print(
+            f"{replicas:>4}x{threads:<3} {result['throughput']:>10.2f} "
+            f"{result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wav", help="16 kHz mono WAV file to transcribe")
+    parser.add_argument("--seconds", type=float, default=5.0, help="audio per request")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="requests in flight, twice the replicas by default",
+    )
+    parser.add_argument(
+        "--splits", nargs="+", help="replicas x threads to try, e.g. 2x4"
+    )
+    asyncio.run(main(parser.parse_args()))